@@ -252,40 +252,101 @@ class DerivedEquipment(BaseEquipment):
         return f"DerivedEquipment(name='{self.name}', gender='{self.gender}', skill='{self.skill}', additional_info='{self.additional_info}')"
 
 
-def recommend_board(user, boards):
+class Recommendation:
+    """Результат подбора: найденное снаряжение или промах по каждой категории"""
+
+    CATEGORIES = ("board", "boots", "fasteners", "helmet")
+    MISS_MESSAGES = {
+        "board": "No suitable board found.",
+        "boots": "No suitable boots found.",
+        "fasteners": "No suitable fasteners found.",
+        "helmet": "No suitable helmet found.",
+    }
+
+    def __init__(self, board=None, boots=None, fasteners=None, helmet=None):
+        self.board = board
+        self.boots = boots
+        self.fasteners = fasteners
+        self.helmet = helmet
+
+    def get(self, category):
+        return getattr(self, category)
+
+    def found(self, category):
+        return getattr(self, category) is not None
+
+    def misses(self):
+        return [category for category in self.CATEGORIES if not self.found(category)]
+
+    def require(self, category):
+        item = getattr(self, category)
+        if item is None:
+            raise EquipmentNotFoundError(self.MISS_MESSAGES[category])
+        return item
+
+    def __repr__(self):
+        return (f"Recommendation(board={self.board!r}, boots={self.boots!r}, "
+                f"fasteners={self.fasteners!r}, helmet={self.helmet!r})")
+
+
+def match_board(user, boards):
     for board in boards:
         if (board.gender == user.gender and
             board.skill == user.skill and
             board.height >= user.height - 10 and
             board.height <= user.height + 10):
             return board
-    raise EquipmentNotFoundError("No suitable board found.")
+    return None
 
 
-def recommend_boots(user, boots):
+def match_boots(user, boots):
     for boot in boots:
         if (boot.gender == user.gender and
             boot.skill == user.skill and
             boot.leg_size == user.leg_size):
             return boot
-    raise EquipmentNotFoundError("No suitable boots found.")
+    return None
 
 
-def recommend_fasteners(user, fasteners):
+def match_fasteners(user, fasteners):
     for fastener in fasteners:
         if (fastener.gender == user.gender and
             fastener.skill == user.skill and
             fastener.fasteners == user.fasteners):
             return fastener
-    raise EquipmentNotFoundError("No suitable fasteners found.")
+    return None
 
 
-def recommend_helmet(user, helmets):
+def match_helmet(user, helmets):
     for helmet in helmets:
         if (helmet.gender == user.gender and
             helmet.size == user.helmet_size):
             return helmet
-    raise EquipmentNotFoundError("No suitable helmet found.")
+    return None
+
+
+def recommend_equipment(user, boards, boots, fasteners, helmets):
+    """Подбор всех категорий без исключений: промахи отмечаются в результате"""
+    return Recommendation(board=match_board(user, boards),
+                          boots=match_boots(user, boots),
+                          fasteners=match_fasteners(user, fasteners),
+                          helmet=match_helmet(user, helmets))
+
+
+def recommend_board(user, boards):
+    return Recommendation(board=match_board(user, boards)).require("board")
+
+
+def recommend_boots(user, boots):
+    return Recommendation(boots=match_boots(user, boots)).require("boots")
+
+
+def recommend_fasteners(user, fasteners):
+    return Recommendation(fasteners=match_fasteners(user, fasteners)).require("fasteners")
+
+
+def recommend_helmet(user, helmets):
+    return Recommendation(helmet=match_helmet(user, helmets)).require("helmet")
 
 
 def edit_user_info(user):
@@ -1,16 +1,168 @@
+import asyncio
+import csv
+import gc
+import heapq
+import io
+import json
 import logging
+import math
+import mmap
+import multiprocessing
+import numbers
+import os
+import pickle
+import random
+import shutil
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+import urllib.parse
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime
+from http import HTTPStatus
 from abc import ABC, abstractmethod
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from itertools import chain, islice
+from multiprocessing import shared_memory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+LOG_FILE = 'equipment_log.log'
 
 logging.basicConfig(
     level=logging.INFO,
-    filename='equipment_log.log',
+    filename=LOG_FILE,
     format='%(asctime)s - %(levelname)s - %(message)s',
     filemode='a'
 )
 
+class AsyncLogWriter:
+    """Фоновая запись лога: ограниченная очередь, отдельный поток и запись пачками.
+
+    Вызывающий поток только ставит запись в очередь: и файл, и необязательное эхо "LOG: ..."
+    (console=True) пишет фоновый поток, одним write на пачку. Эхо по умолчанию выключено:
+    фоновые строки перемежались бы с выводом меню. Политики переполнения очереди: "block" -
+    ждать места, "drop-oldest" - выбросить самую старую запись, "sample" - сохранять только
+    каждую sample_every-ю лишнюю запись (вместо самой старой, без ожидания).
+    """
+
+    POLICIES = ("block", "drop-oldest", "sample")
+
+    def __init__(self, filename=LOG_FILE, maxsize=10000, policy="block", sample_every=10,
+                 batch_size=512, console=False):
+        if policy not in self.POLICIES:
+            raise InvalidInputError(f"Unknown overflow policy: {policy}")
+        self.filename = filename
+        self.maxsize = maxsize
+        self.policy = policy
+        self.sample_every = sample_every
+        self.batch_size = batch_size
+        self.console = console
+        self.records = deque()
+        self.condition = threading.Condition()
+        self.pending = 0
+        self.overflowed = 0
+        self.dropped = 0
+        self.written = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, message):
+        record = (time.time(), message)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Log writer is closed.")
+            if len(self.records) >= self.maxsize:
+                self.overflowed += 1
+                if self.policy == "sample" and self.overflowed % self.sample_every:
+                    self.dropped += 1
+                    record = None
+                elif self.policy in ("drop-oldest", "sample"):
+                    self.records.popleft()
+                    self.pending -= 1
+                    self.dropped += 1
+                else:
+                    while len(self.records) >= self.maxsize:
+                        self.condition.wait()
+            if record is not None:
+                self.records.append(record)
+                self.pending += 1
+                self.condition.notify_all()
+
+    def _run(self):
+        with open(self.filename, "a", encoding="utf-8") as log_file:
+            while True:
+                with self.condition:
+                    while not self.records and not self.closed:
+                        self.condition.wait()
+                    if not self.records and self.closed:
+                        return
+                    batch = [self.records.popleft()
+                             for _ in range(min(self.batch_size, len(self.records)))]
+                    self.condition.notify_all()
+                log_file.write("".join(self._format(created, message) for created, message in batch))
+                log_file.flush()
+                if self.console:
+                    sys.stdout.write("".join(f"LOG: {message}\n" for _, message in batch))
+                    sys.stdout.flush()
+                with self.condition:
+                    self.pending -= len(batch)
+                    self.written += len(batch)
+                    self.condition.notify_all()
+
+    @staticmethod
+    def _format(created, message):
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created))
+        return f"{timestamp},{int(created % 1 * 1000):03d} - INFO - {message}\n"
+
+    def flush(self):
+        with self.condition:
+            while self.pending > 0:
+                self.condition.wait()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def stats(self):
+        with self.condition:
+            return {"written": self.written, "dropped": self.dropped,
+                    "overflowed": self.overflowed, "queued": len(self.records)}
+
+log_writer = None
+
+def start_async_logging(**options):
+    """Переключает log_action на фоновую запись"""
+    global log_writer
+    if log_writer is None:
+        log_writer = AsyncLogWriter(**options)
+    return log_writer
+
+def stop_async_logging():
+    """Дописывает очередь и возвращает log_action к синхронной записи"""
+    global log_writer
+    writer, log_writer = log_writer, None
+    if writer is not None:
+        writer.close()
+
 def log_action(message):
     """Функция для логирования действий"""
+    if log_writer is not None:
+        log_writer.submit(message)
+        return
     logging.info(message)
     print(f"LOG: {message}")
 
@@ -23,14 +175,23 @@ class InvalidInputError(CustomError):
 class EquipmentNotFoundError(CustomError):
     pass
 
+bulk_construction = threading.local()
+
 class Equipment(ABC):
+    __slots__ = ("name", "gender", "skill", "created_at")
     total_equipment = 0
+    counter_lock = threading.Lock()
 
     def __init__(self, name, gender, skill):
-        Equipment.total_equipment += 1
         self.name = name
         self.gender = gender
         self.skill = skill
+        batch_created_at = getattr(bulk_construction, "created_at", None)
+        if batch_created_at is not None:
+            self.created_at = batch_created_at
+            return
+        with Equipment.counter_lock:
+            Equipment.total_equipment += 1
         self.created_at = datetime.now()
         log_action(f"Created Equipment: {name} ({self.__class__.__name__})")
 
@@ -38,6 +199,21 @@ class Equipment(ABC):
     def get_total_equipment():
         return Equipment.total_equipment
 
+    @classmethod
+    def bulk_create(cls, rows):
+        """Массовое создание из кортежей аргументов конструктора: одна метка времени,
+        одно обновление счетчика и одна запись в лог на всю пачку"""
+        rows = list(rows)
+        bulk_construction.created_at = datetime.now()
+        try:
+            items = [cls(*row) for row in rows]
+        finally:
+            bulk_construction.created_at = None
+        with Equipment.counter_lock:
+            Equipment.total_equipment += len(items)
+        log_action(f"Created {len(items)} Equipment objects ({cls.__name__}) in bulk")
+        return items
+
     @abstractmethod
     def __str__(self):
         pass
@@ -72,6 +248,9 @@ class Equipment(ABC):
         pass
 
 class User:
+    __slots__ = ("name", "age", "gender", "skill", "height", "weight",
+                 "clothing_size", "leg_size", "fasteners", "helmet_size")
+
     def __init__(self, name, age, gender, skill, height, weight, clothing_size, leg_size, fasteners_size, helmet_size):
         self.name = name
         self.age = age
@@ -90,271 +269,4619 @@ class User:
                 f"Height: {self.height}, Weight: {self.weight}, Clothing Size: {self.clothing_size}, "
                 f"Leg Size: {self.leg_size}, Fasteners Size: {self.fasteners}, Helmet Size: {self.helmet_size})")
 
-    def __repr__(self):
-        return (f"User(name='{self.name}', age={self.age}, gender='{self.gender}', skill='{self.skill}', "
-                f"height={self.height}, weight={self.weight}, clothing_size='{self.clothing_size}', "
-                f"leg_size={self.leg_size}, fasteners_size='{self.fasteners}', helmet_size='{self.helmet_size}')")
+    def __repr__(self):
+        return (f"User(name='{self.name}', age={self.age}, gender='{self.gender}', skill='{self.skill}', "
+                f"height={self.height}, weight={self.weight}, clothing_size='{self.clothing_size}', "
+                f"leg_size={self.leg_size}, fasteners_size='{self.fasteners}', helmet_size='{self.helmet_size}')")
+
+    @classmethod
+    def from_input(cls):
+        try:
+            name = input("Enter name: ")
+            age = int(input("Enter age: "))
+            gender = input("Enter gender: ")
+            skill = input("Enter skill level (beginner, intermediate, advanced): ")
+            height = float(input("Enter height (in cm): "))
+            weight = float(input("Enter weight (in kg): "))
+            clothing_size = input("Enter clothing size: ")
+            leg_size = float(input("Enter leg size (in cm): "))
+            fasteners_size = input("Enter fasteners size: ")
+            helmet_size = input("Enter helmet size: ")
+            return cls(name, age, gender, skill, height, weight, clothing_size, leg_size, fasteners_size, helmet_size)
+        except ValueError as e:
+            raise InvalidInputError(f"Invalid input: {e}")
+
+    def update_skill(self, new_skill):
+        self.skill = new_skill
+        log_action(f"User {self.name} skill updated to: {self.skill}")
+        print(f"Skill updated to: {self.skill}")
+
+class Board(Equipment):
+    __slots__ = ("height",)
+    type = "Snowboard"
+
+    def __init__(self, name, gender, skill, height):
+        super().__init__(name, gender, skill)
+        self.height = height
+
+    def __str__(self):
+        return f"Board(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill}, Height: {self.height})"
+
+    def __repr__(self):
+        return f"Board(name='{self.name}', gender='{self.gender}', skill='{self.skill}', height={self.height})"
+
+    def get_usage_instructions(self):
+        return f"Attach boots to {self.name} board using fasteners. Suitable for {self.skill} level."
+
+    def calculate_rental_price(self, days):
+        base_price = 30 if self.skill == "beginner" else 40 if self.skill == "intermediate" else 50
+        return base_price * days * (1 + 0.1 * (self.height / 100))
+
+    def perform_trick(self, trick_name):
+        log_action(f"Board {self.name} performing trick: {trick_name}")
+        return f"{self.name} is performing {trick_name} trick!"
+
+    @classmethod
+    def from_input(cls):
+        try:
+            name = input("Enter board name: ")
+            gender = input("Enter gender: ")
+            skill = input("Enter skill level (beginner, intermediate, advanced): ")
+            height = float(input("Enter recommended height (in cm): "))
+            return cls(name, gender, skill, height)
+        except ValueError as e:
+            raise InvalidInputError(f"Invalid input: {e}")
+
+class Boots(Equipment):
+    __slots__ = ("leg_size", "comfort_level")
+
+    def __init__(self, name, gender, skill, leg_size):
+        super().__init__(name, gender, skill)
+        self.leg_size = leg_size
+        self.comfort_level = "medium"
+
+    def __str__(self):
+        return f"Boots(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill}, Leg Size: {self.leg_size})"
+
+    def __repr__(self):
+        return f"Boots(name='{self.name}', gender='{self.gender}', skill='{self.skill}', leg_size={self.leg_size})"
+
+    def get_usage_instructions(self):
+        return f"Wear {self.name} boots and secure them properly. Size: {self.leg_size}"
+
+    def calculate_rental_price(self, days):
+        return 15 * days * (1.2 if self.gender == "female" else 1.0)
+
+    def adjust_comfort(self, level):
+        self.comfort_level = level
+        log_action(f"Boots {self.name} comfort adjusted to {level}")
+        return f"Comfort level adjusted to {level}"
+
+    @classmethod
+    def from_input(cls):
+        try:
+            name = input("Enter boots name: ")
+            gender = input("Enter gender: ")
+            skill = input("Enter skill level (beginner, intermediate, advanced): ")
+            leg_size = float(input("Enter leg size (in cm): "))
+            return cls(name, gender, skill, leg_size)
+        except ValueError as e:
+            raise InvalidInputError(f"Invalid input: {e}")
+
+class Fasteners(Equipment):
+    __slots__ = ("fasteners", "adjustment")
+
+    def __init__(self, name, gender, skill, fasteners_size):
+        super().__init__(name, gender, skill)
+        self.fasteners = fasteners_size
+        self.adjustment = "medium"
+
+    def __str__(self):
+        return f"Fasteners(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill}, Fasteners Size: {self.fasteners})"
+
+    def __repr__(self):
+        return f"Fasteners(name='{self.name}', gender='{self.gender}', skill='{self.skill}', fasteners_size='{self.fasteners}')"
+
+    def get_usage_instructions(self):
+        return f"Use {self.name} fasteners to secure boots to board. Size: {self.fasteners}"
+
+    def calculate_rental_price(self, days):
+        return 10 * days
+
+    def adjust_tightness(self, level):
+        self.adjustment = level
+        log_action(f"Fasteners {self.name} tightness adjusted to {level}")
+        return f"Tightness adjusted to {level}"
+
+    @classmethod
+    def from_input(cls):
+        try:
+            name = input("Enter fasteners name: ")
+            gender = input("Enter gender: ")
+            skill = input("Enter skill level (beginner, intermediate, advanced): ")
+            fasteners_size = input("Enter fasteners size: ")
+            return cls(name, gender, skill, fasteners_size)
+        except ValueError as e:
+            raise InvalidInputError(f"Invalid input: {e}")
+
+class Helmet(Equipment):
+    __slots__ = ("size", "ventilation")
+
+    def __init__(self, name, gender, helmet_size):
+        super().__init__(name, gender, "all")
+        self.size = helmet_size
+        self.ventilation = "open"
+
+    def __str__(self):
+        return f"Helmet(Name: {self.name}, Gender: {self.gender}, Size: {self.size})"
+
+    def __repr__(self):
+        return f"Helmet(name='{self.name}', gender='{self.gender}', helmet_size='{self.size}')"
+
+    def get_usage_instructions(self):
+        return f"Wear {self.name} helmet and secure the strap. Size: {self.size}"
+
+    def calculate_rental_price(self, days):
+        return 8 * days * (1.1 if self.gender == "female" else 1.0)
+
+    def adjust_ventilation(self, status):
+        self.ventilation = status
+        log_action(f"Helmet {self.name} ventilation adjusted to {status}")
+        return f"Ventilation adjusted to {status}"
+
+    @classmethod
+    def from_input(cls):
+        try:
+            name = input("Enter helmet name: ")
+            gender = input("Enter gender: ")
+            helmet_size = input("Enter helmet size: ")
+            return cls(name, gender, helmet_size)
+        except ValueError as e:
+            raise InvalidInputError(f"Invalid input: {e}")
+
+class EquipmentManager:
+    @staticmethod
+    def find_max_value(items_2d, attribute="height"):
+        if not items_2d or not any(items_2d):
+            raise ValueError("The list is empty or contains no elements.")
+
+        max_item = None
+        max_value = float('-inf')
+
+        for row in items_2d:
+            for item in row:
+                if not hasattr(item, attribute):
+                    raise AttributeError(f"Attribute '{attribute}' does not exist in the object.")
+                current_value = getattr(item, attribute)
+                if current_value > max_value:
+                    max_value = current_value
+                    max_item = item
+
+        return max_item
+
+    @staticmethod
+    def aggregate(items_2d, reductions, getters=None):
+        """Несколько редукций по нескольким атрибутам за один проход по 2D-списку.
+
+        reductions: {атрибут: ("max", "min", "argmax", "argmin", "sum", "count", "mean")}.
+        getters: {атрибут: функция(item)} для вычисляемых значений, например цены.
+        Позиции без атрибута пропускаются. Строки-колоночные хранилища считаются по колонкам.
+        """
+        for attribute, operations in reductions.items():
+            for operation in operations:
+                if operation not in AttributeAggregate.OPERATIONS:
+                    raise ValueError(f"Unknown reduction: {operation}")
+        getters = getters or {}
+        aggregates = {attribute: AttributeAggregate() for attribute in reductions}
+        plain = [(aggregates[attribute], attribute) for attribute in reductions
+                 if attribute not in getters]
+        computed = [(aggregates[attribute], getters[attribute]) for attribute in reductions
+                    if attribute in getters]
+
+        for row in items_2d:
+            if isinstance(row, ColumnarIndex):
+                plain_left = []
+                for aggregate, attribute in plain:
+                    if attribute == row.attribute and not row.categorical:
+                        aggregate.add_column(row, row.values)
+                    else:
+                        plain_left.append((aggregate, attribute))
+                if not plain_left and not computed:
+                    continue
+                row_plain = plain_left
+            else:
+                row_plain = plain
+            for item in row:
+                for aggregate, attribute in row_plain:
+                    value = getattr(item, attribute, MISSING)
+                    if value is not MISSING:
+                        aggregate.add(item, value)
+                for aggregate, getter in computed:
+                    value = getter(item)
+                    if value is not None:
+                        aggregate.add(item, value)
+
+        return {attribute: aggregates[attribute].result(operations)
+                for attribute, operations in reductions.items()}
+
+MISSING = object()
+
+class AttributeAggregate:
+    """Накопитель редукций по одному атрибуту"""
+
+    OPERATIONS = ("max", "min", "argmax", "argmin", "sum", "count", "mean")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.maximum = None
+        self.argmax = None
+        self.minimum = None
+        self.argmin = None
+        self.numeric = True
+
+    def add(self, item, value):
+        self.count += 1
+        # sum и mean - только для чисел; max, min и count работают для любых упорядоченных значений
+        if isinstance(value, numbers.Number) and not isinstance(value, bool):
+            self.total += value
+        else:
+            self.numeric = False
+        if self.count == 1:
+            self.maximum = self.minimum = value
+            self.argmax = self.argmin = item
+            return
+        if value > self.maximum:
+            self.maximum = value
+            self.argmax = item
+        if value < self.minimum:
+            self.minimum = value
+            self.argmin = item
+
+    def add_column(self, store, column):
+        if not len(column):
+            return
+        if np is not None:
+            values = np.frombuffer(column, dtype=np.float64)
+            max_row = int(values.argmax())
+            min_row = int(values.argmin())
+            total = float(values.sum())
+        else:
+            rows = range(len(column))
+            max_row = max(rows, key=column.__getitem__)
+            min_row = min(rows, key=column.__getitem__)
+            total = math.fsum(column)
+        self.merge(len(column), total, column[max_row], EquipmentRow(store, max_row),
+                   column[min_row], EquipmentRow(store, min_row))
+
+    def merge(self, count, total, maximum, argmax, minimum, argmin):
+        if self.count == 0:
+            self.count, self.total = count, total
+            self.maximum, self.argmax = maximum, argmax
+            self.minimum, self.argmin = minimum, argmin
+            return
+        self.count += count
+        self.total += total
+        if maximum > self.maximum:
+            self.maximum, self.argmax = maximum, argmax
+        if minimum < self.minimum:
+            self.minimum, self.argmin = minimum, argmin
+
+    def value(self, operation):
+        if operation in ("sum", "mean") and not self.numeric:
+            return None
+        if operation == "mean":
+            return self.total / self.count if self.count else None
+        return {"max": self.maximum, "min": self.minimum, "argmax": self.argmax,
+                "argmin": self.argmin, "sum": self.total, "count": self.count}[operation]
+
+    def result(self, operations):
+        return {operation: self.value(operation) for operation in operations}
+
+def numeric_attributes(item):
+    if isinstance(item, EquipmentRow):
+        store = item.store
+        return () if store.categorical else ((store.attribute, item.value(store.attribute)),)
+    attributes = []
+    for cls in type(item).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            value = getattr(item, name, None)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                attributes.append((name, value))
+    return attributes
+
+class ExtremaTracker:
+    """Кучи максимумов и минимумов по каждому числовому атрибуту.
+
+    Вставка и удаление - O(log n) (удаленные записи вычищаются с вершин куч сразу),
+    поэтому максимум и минимум всегда лежат на вершине и читаются за O(1).
+    Атрибуты позиции фиксируются при вставке.
+    """
+
+    def __init__(self):
+        self.next_token = 0
+        self.entries = {}
+        self.max_heaps = {}
+        self.min_heaps = {}
+        self.attribute_counts = Counter()
+
+    def insert(self, item):
+        token = self.next_token
+        self.next_token += 1
+        attributes = numeric_attributes(item)
+        self.entries[token] = (item, [name for name, _ in attributes])
+        for name, value in attributes:
+            heapq.heappush(self.max_heaps.setdefault(name, []), (-value, token, item))
+            heapq.heappush(self.min_heaps.setdefault(name, []), (value, token, item))
+            self.attribute_counts[name] += 1
+        return token
+
+    def discard(self, token):
+        _, attributes = self.entries.pop(token)
+        for name in attributes:
+            self.attribute_counts[name] -= 1
+            self._prune(self.max_heaps[name])
+            self._prune(self.min_heaps[name])
+
+    def _prune(self, heap):
+        while heap and heap[0][1] not in self.entries:
+            heapq.heappop(heap)
+
+    def tracks(self, attribute):
+        return self.attribute_counts[attribute] > 0
+
+    def covers(self, attribute):
+        """Есть ли атрибут у каждой позиции"""
+        return self.entries and self.attribute_counts[attribute] == len(self.entries)
+
+    def max_item(self, attribute):
+        heap = self.max_heaps.get(attribute)
+        return heap[0][2] if heap else None
+
+    def min_item(self, attribute):
+        heap = self.min_heaps.get(attribute)
+        return heap[0][2] if heap else None
+
+    def max_value(self, attribute):
+        heap = self.max_heaps.get(attribute)
+        return -heap[0][0] if heap else None
+
+    def min_value(self, attribute):
+        heap = self.min_heaps.get(attribute)
+        return heap[0][0] if heap else None
+
+    def __len__(self):
+        return len(self.entries)
+
+class AggregatingList(list):
+    """Список снаряжения, поддерживающий экстремумы числовых атрибутов при изменениях"""
+
+    def __init__(self, items=(), tracker=None):
+        super().__init__()
+        self.tracker = ExtremaTracker() if tracker is None else tracker
+        self.tokens = []
+        self.extend(items)
+
+    def append(self, item):
+        super().append(item)
+        self.tokens.append(self.tracker.insert(item))
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def insert(self, index, item):
+        super().insert(index, item)
+        self.tokens.insert(index, self.tracker.insert(item))
+
+    def pop(self, index=-1):
+        item = super().pop(index)
+        self.tracker.discard(self.tokens.pop(index))
+        return item
+
+    def remove(self, item):
+        self.pop(self.index(item))
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for token in self.tokens[index]:
+                self.tracker.discard(token)
+            del self.tokens[index]
+        else:
+            self.tracker.discard(self.tokens.pop(index))
+        super().__delitem__(index)
+
+    def __setitem__(self, index, item):
+        if isinstance(index, slice):
+            raise TypeError("Slice assignment is not supported.")
+        self.tracker.discard(self.tokens[index])
+        self.tokens[index] = self.tracker.insert(item)
+        super().__setitem__(index, item)
+
+    def clear(self):
+        for token in self.tokens:
+            self.tracker.discard(token)
+        self.tokens.clear()
+        super().clear()
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def __imul__(self, times):
+        if times <= 0:
+            self.clear()
+        else:
+            self.extend(list(self) * (times - 1))
+        return self
+
+    def sort(self, *, key=None, reverse=False):
+        # Токены переставляются вместе с позициями, иначе pop(i) снимет с трекера чужую позицию
+        order = sorted(range(len(self)), key=lambda index: self[index] if key is None else key(self[index]),
+                       reverse=reverse)
+        self.tokens = [self.tokens[index] for index in order]
+        super().__setitem__(slice(None), [self[index] for index in order])
+
+    def reverse(self):
+        super().reverse()
+        self.tokens.reverse()
+
+    def max_item(self, attribute):
+        return self.tracker.max_item(attribute)
+
+    def min_item(self, attribute):
+        return self.tracker.min_item(attribute)
+
+class AggregatingGrid(list):
+    """2D-список снаряжения: все строки делят один ExtremaTracker"""
+
+    def __init__(self, rows=()):
+        super().__init__()
+        self.tracker = ExtremaTracker()
+        for row in rows:
+            self.append(row)
+
+    def append(self, row):
+        super().append(AggregatingList(row, self.tracker))
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def __iadd__(self, rows):
+        self.extend(rows)
+        return self
+
+    def __imul__(self, times):
+        if times <= 0:
+            self.clear()
+        else:
+            self.extend(list(self) * (times - 1))
+        return self
+
+    def insert(self, index, row):
+        super().insert(index, AggregatingList(row, self.tracker))
+
+    def __setitem__(self, index, row):
+        if isinstance(index, slice):
+            raise TypeError("Slice assignment is not supported.")
+        self[index].clear()
+        super().__setitem__(index, AggregatingList(row, self.tracker))
+
+    def pop(self, index=-1):
+        row = super().pop(index)
+        row.clear()
+        return row
+
+    def remove(self, row):
+        self.pop(self.index(row))
+
+    def __delitem__(self, index):
+        for row in (self[index] if isinstance(index, slice) else [self[index]]):
+            row.clear()
+        super().__delitem__(index)
+
+    def clear(self):
+        for row in self:
+            row.clear()
+        super().clear()
+
+    def max_item(self, attribute):
+        return self.tracker.max_item(attribute)
+
+    def min_item(self, attribute):
+        return self.tracker.min_item(attribute)
+
+class BaseEquipment(Equipment):
+    __slots__ = ()
+
+    def __init__(self, name, gender, skill):
+        super().__init__(name, gender, skill)
+
+    def display_info(self):
+        print(f"Base Equipment Info: {self.name}, {self.gender}, {self.skill}")
+
+    def __str__(self):
+        return f"BaseEquipment(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill})"
+
+    def __repr__(self):
+        return f"BaseEquipment(name='{self.name}', gender='{self.gender}', skill='{self.skill}')"
+
+    def get_usage_instructions(self):
+        return "Basic usage instructions for all equipment"
+
+    def calculate_rental_price(self, days):
+        return 20 * days
+
+class DerivedEquipment(BaseEquipment):
+    __slots__ = ("additional_info",)
+
+    def __init__(self, name, gender, skill, additional_info):
+        super().__init__(name, gender, skill)
+        self.additional_info = additional_info
+
+    def display_info(self):
+        print(f"Derived Equipment Info: {self.name}, {self.gender}, {self.skill}, {self.additional_info}")
+
+    def call_base_display(self):
+        super().display_info()
+
+    def conditional_display(self, condition):
+        if condition:
+            self.display_info()
+        else:
+            super().display_info()
+
+    def __str__(self):
+        return f"DerivedEquipment(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill}, Additional Info: {self.additional_info})"
+
+    def __repr__(self):
+        return f"DerivedEquipment(name='{self.name}', gender='{self.gender}', skill='{self.skill}', additional_info='{self.additional_info}')"
+
+    def get_usage_instructions(self):
+        return f"Special instructions: {self.additional_info}"
+
+    def calculate_rental_price(self, days):
+        return super().calculate_rental_price(days) * 1.5
+
+def board_price_coefficients(board):
+    base_price = 30 if board.skill == "beginner" else 40 if board.skill == "intermediate" else 50
+    return base_price, 1 + 0.1 * (board.height / 100)
+
+# Каждая формула calculate_rental_price имеет вид a * days * b
+PRICE_COEFFICIENTS = {
+    Board: board_price_coefficients,
+    Boots: lambda boot: (15, 1.2 if boot.gender == "female" else 1.0),
+    Fasteners: lambda fastener: (10, 1),
+    Helmet: lambda helmet: (8, 1.1 if helmet.gender == "female" else 1.0),
+    BaseEquipment: lambda item: (20, 1),
+    DerivedEquipment: lambda item: (20, 1.5),
+}
+
+class RentalPricingEngine:
+    """Пакетный расчет аренды: позиции сгруппированы по типу, формула a * days * b
+    вычисляется сразу для вектора дней (через NumPy, если он установлен)"""
+
+    def __init__(self, items=()):
+        self.groups = {}
+        self.weights = Counter()
+        self.others = []
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        cls = equipment_class(item)
+        coefficients = PRICE_COEFFICIENTS.get(cls)
+        if coefficients is None:
+            self.others.append(item)
+            return
+        group = self.groups.get(cls)
+        if group is None:
+            group = self.groups[cls] = ([], [], [])
+        a, b = coefficients(item)
+        self.weights[(a, b)] += 1
+        group[0].append(item)
+        group[1].append(a)
+        group[2].append(b)
+
+    def price_matrices(self, days):
+        """Для каждого типа: (позиции, матрица цен позиции x количество дней)"""
+        days = list(days)
+        for cls, (items, a, b) in self.groups.items():
+            if np is not None:
+                prices = (np.array(a)[:, None] * np.array(days)[None, :]) * np.array(b)[:, None]
+            else:
+                prices = [[a_i * day * b_i for day in days] for a_i, b_i in zip(a, b)]
+            yield cls, items, prices
+        if self.others:
+            yield None, self.others, [[item.calculate_rental_price(day) for day in days]
+                                      for item in self.others]
+
+    def item_prices(self, days):
+        days = list(days)
+        for _, items, prices in self.price_matrices(days):
+            for item, row in zip(items, prices):
+                yield item, row.tolist() if hasattr(row, "tolist") else row
+
+    def totals(self, days):
+        """Суммарная выручка по всем позициям для каждого количества дней.
+
+        Позиции с одинаковыми коэффициентами (a, b) суммируются одним умножением на их число.
+        """
+        days = list(days)
+        pairs = list(self.weights.items())
+        if np is not None and pairs:
+            a = np.array([pair[0] for pair, _ in pairs])[:, None]
+            b = np.array([pair[1] for pair, _ in pairs])[:, None]
+            counts = np.array([count for _, count in pairs])[:, None]
+            columns = ((a * np.array(days)[None, :]) * b * counts).T.tolist()
+        else:
+            columns = [[a * day * b * count for (a, b), count in pairs] for day in days]
+        for item in self.others:
+            for column, day in zip(columns, days):
+                column.append(item.calculate_rental_price(day))
+        return [math.fsum(column) for column in columns]
+
+def price_key(item):
+    cls = equipment_class(item)
+    return (cls, item.skill, item.gender, item.height if issubclass(cls, Board) else None)
+
+class PriceTable:
+    """Предрассчитанные дневные ставки по (тип, уровень, пол), у досок еще и по росту.
+
+    Таблица подписывается на изменения каталога и обновляется инкрементально;
+    время полной перестройки и инкрементальных обновлений учитывается в stats().
+    """
+
+    def __init__(self, catalog=None):
+        self.rates = {}
+        self.counts = Counter()
+        self.others = []
+        self.catalog = None
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+        self.updates = 0
+        self.update_seconds = 0.0
+        if catalog is not None:
+            self.attach(catalog)
+
+    def attach(self, catalog):
+        self.catalog = catalog
+        for collection in (catalog.boards, catalog.boots, catalog.fasteners, catalog.helmets):
+            collection.subscribe(self._on_change)
+        self.rebuild()
+
+    def rebuild(self):
+        start = time.perf_counter()
+        self.rates.clear()
+        self.counts.clear()
+        self.others = []
+        if self.catalog is not None:
+            for item in self.catalog:
+                self._count(item, 1)
+        elapsed = time.perf_counter() - start
+        self.rebuilds += 1
+        self.rebuild_seconds += elapsed
+        log_action(f"Price table rebuilt: {len(self.rates)} rates for {sum(self.counts.values())} items "
+                   f"in {elapsed * 1000:.1f} ms")
+
+    def _on_change(self, event, item):
+        if event == "clear":
+            self.rebuild()
+            return
+        start = time.perf_counter()
+        self._count(item, 1 if event == "add" else -1)
+        self.updates += 1
+        self.update_seconds += time.perf_counter() - start
+
+    def _count(self, item, delta):
+        rate = self.rate(item)
+        if rate is None:
+            if delta > 0:
+                self.others.append(item)
+            else:
+                self.others.remove(item)
+            return
+        key = price_key(item)
+        self.counts[key] += delta
+        if self.counts[key] <= 0:
+            del self.counts[key]
+
+    def rate(self, item):
+        """Коэффициенты (a, b) дневной ставки: цена = a * days * b"""
+        key = price_key(item)
+        rate = self.rates.get(key)
+        if rate is None:
+            coefficients = PRICE_COEFFICIENTS.get(key[0])
+            if coefficients is None:
+                return None
+            rate = self.rates[key] = coefficients(item)
+        return rate
+
+    def price(self, item, days):
+        rate = self.rate(item)
+        if rate is None:
+            return item.calculate_rental_price(days)
+        return rate[0] * days * rate[1]
+
+    def quote(self, items, days):
+        """Цены для списка позиций: для каждого количества дней - сумма по позициям"""
+        days = list(days)
+        weights = Counter()
+        others = []
+        for item in items:
+            rate = self.rate(item)
+            if rate is None:
+                others.append(item)
+            else:
+                weights[rate] += 1
+        return [math.fsum([a * day * b * count for (a, b), count in weights.items()] +
+                          [item.calculate_rental_price(day) for item in others])
+                for day in days]
+
+    def fleet_quote(self, days):
+        """Выручка по всему каталогу без обхода позиций"""
+        return [math.fsum([self.rates[key][0] * day * self.rates[key][1] * count
+                           for key, count in self.counts.items()] +
+                          [item.calculate_rental_price(day) for item in self.others])
+                for day in days]
+
+    def stats(self):
+        return {"rates": len(self.rates), "rebuilds": self.rebuilds,
+                "rebuild_seconds": self.rebuild_seconds, "updates": self.updates,
+                "update_seconds": self.update_seconds}
+
+class EquipmentIndex(set):
+    """Множество снаряжения с хеш-индексом по ключу для поиска за O(1)"""
+
+    def __init__(self, key, items=()):
+        super().__init__()
+        self.key = key
+        self.key_fields = getattr(key, "fields", None)
+        self.members = {}
+        self.buckets = {}
+        self.version = 0
+        self.listeners = []
+        self.update(items)
+
+    def subscribe(self, listener):
+        """listener(event, item) вызывается после каждого изменения: add, discard, clear"""
+        self.listeners.append(listener)
+
+    def _notify(self, event, item):
+        for listener in self.listeners:
+            listener(event, item)
+
+    def __iter__(self):
+        # Порядок добавления, как внутри групп buckets: снимки и шарды сохраняют тот же
+        # порядок равных позиций, что и последовательный подбор, а не хеш-порядок множества
+        return iter(self.members)
+
+    def add(self, item):
+        if item in self.members:
+            return
+        super().add(item)
+        self.members[item] = item
+        self._insert(self.key(item), item)
+        self.version += 1
+        self._notify("add", item)
+
+    def _insert(self, bucket_key, item):
+        self.buckets.setdefault(bucket_key, []).append(item)
+
+    def _delete(self, bucket_key, item):
+        bucket = self.buckets[bucket_key]
+        bucket.remove(item)
+        if not bucket:
+            del self.buckets[bucket_key]
+
+    def update(self, *iterables):
+        for items in iterables:
+            for item in items:
+                self.add(item)
+
+    def discard(self, item):
+        stored = self.members.pop(item, None)
+        if stored is None:
+            return
+        super().discard(stored)
+        self._delete(self.key(stored), stored)
+        self.version += 1
+        self._notify("discard", stored)
+
+    def remove(self, item):
+        if item not in self.members:
+            raise KeyError(item)
+        self.discard(item)
+
+    def pop(self):
+        if not self.members:
+            raise KeyError("pop from an empty set")
+        item = next(iter(self.members))
+        self.discard(item)
+        return item
+
+    def clear(self):
+        super().clear()
+        self.members.clear()
+        self.buckets.clear()
+        self.version += 1
+        self._notify("clear", None)
+
+    def lookup(self, *key):
+        return self.buckets.get(key, ())
+
+    def bucket_keys(self):
+        return self.buckets.keys()
+
+class SortedEquipmentIndex(EquipmentIndex):
+    """Индекс снаряжения, отсортированный по числовому атрибуту внутри каждой группы"""
+
+    def __init__(self, key, attribute, items=()):
+        self.attribute = attribute
+        self.values = {}
+        super().__init__(key, items)
+
+    def _insert(self, bucket_key, item):
+        values = self.values.setdefault(bucket_key, [])
+        bucket = self.buckets.setdefault(bucket_key, [])
+        value = getattr(item, self.attribute)
+        position = bisect_right(values, value)
+        values.insert(position, value)
+        bucket.insert(position, item)
+
+    def _delete(self, bucket_key, item):
+        values = self.values[bucket_key]
+        bucket = self.buckets[bucket_key]
+        position = bisect_left(values, getattr(item, self.attribute))
+        while bucket[position] is not item:
+            position += 1
+        del values[position]
+        del bucket[position]
+        if not bucket:
+            del self.values[bucket_key]
+            del self.buckets[bucket_key]
+
+    def clear(self):
+        super().clear()
+        self.values.clear()
+
+    def window(self, bucket_key, low, high):
+        values = self.values.get(bucket_key)
+        if not values:
+            return []
+        start = bisect_left(values, low)
+        stop = bisect_right(values, high, start)
+        return self.buckets[bucket_key][start:stop]
+
+    def nearest(self, bucket_key, center, tolerance):
+        """Все элементы группы в окне center ± tolerance в порядке удаления от center"""
+        values = self.values.get(bucket_key)
+        if not values:
+            return []
+        bucket = self.buckets[bucket_key]
+        return [bucket[position] for position in nearest_positions(values, center, tolerance)]
+
+def nearest_positions(values, center, tolerance):
+    """Позиции отсортированной последовательности в окне center ± tolerance по удалению от center"""
+    left = bisect_left(values, center) - 1
+    right = left + 1
+    low = center - tolerance
+    high = center + tolerance
+    while True:
+        left_ok = left >= 0 and values[left] >= low
+        right_ok = right < len(values) and values[right] <= high
+        if left_ok and right_ok:
+            if center - values[left] <= values[right] - center:
+                yield left
+                left -= 1
+            else:
+                yield right
+                right += 1
+        elif left_ok:
+            yield left
+            left -= 1
+        elif right_ok:
+            yield right
+            right += 1
+        else:
+            return
+
+def is_indexed(items):
+    return isinstance(items, (EquipmentIndex, ColumnarIndex, SQLiteTable, MappedCategory, VersionedCategory))
+
+def is_sorted_index(items):
+    return isinstance(items, (SortedEquipmentIndex, SortedColumnarIndex, SortedSQLiteTable,
+                              SortedMappedCategory, SortedVersionedCategory))
+
+def board_key(board):
+    return (board.gender, board.skill)
+
+def boots_key(boot):
+    return (boot.gender, boot.skill, boot.leg_size)
+
+def fasteners_key(fastener):
+    return (fastener.gender, fastener.skill, fastener.fasteners)
+
+def helmet_key(helmet):
+    return (helmet.gender, helmet.size)
+
+board_key.fields = ("gender", "skill")
+boots_key.fields = ("gender", "skill", "leg_size")
+fasteners_key.fields = ("gender", "skill", "fasteners")
+helmet_key.fields = ("gender", "size")
+
+def recommend_board_candidates(user, boards, tolerance=10):
+    """Все подходящие доски в порядке близости к росту пользователя"""
+    if is_sorted_index(boards):
+        return boards.nearest((user.gender, user.skill), user.height, tolerance)
+    candidates = [board for board in boards
+                  if board.gender == user.gender and
+                  board.skill == user.skill and
+                  user.height - tolerance <= board.height <= user.height + tolerance]
+    candidates.sort(key=lambda board: abs(board.height - user.height))
+    return candidates
+
+class Recommendation:
+    """Результат подбора: найденное снаряжение или промах по каждой категории"""
+
+    CATEGORIES = ("board", "boots", "fasteners", "helmet")
+    MISS_MESSAGES = {
+        "board": "No suitable board found.",
+        "boots": "No suitable boots found.",
+        "fasteners": "No suitable fasteners found.",
+        "helmet": "No suitable helmet found.",
+    }
+
+    def __init__(self, board=None, boots=None, fasteners=None, helmet=None, timed_out=()):
+        self.board = board
+        self.boots = boots
+        self.fasteners = fasteners
+        self.helmet = helmet
+        self.timed_out = tuple(timed_out)
+
+    def get(self, category):
+        return getattr(self, category)
+
+    def found(self, category):
+        return getattr(self, category) is not None
+
+    def misses(self):
+        return [category for category in self.CATEGORIES
+                if not self.found(category) and category not in self.timed_out]
+
+    def complete(self):
+        return not self.timed_out
+
+    def require(self, category):
+        item = getattr(self, category)
+        if item is None:
+            if category in self.timed_out:
+                raise EquipmentNotFoundError(f"Recommendation for {category} timed out, please try again.")
+            raise EquipmentNotFoundError(self.MISS_MESSAGES[category])
+        return item
+
+    def __repr__(self):
+        timed_out = f", timed_out={self.timed_out!r}" if self.timed_out else ""
+        return (f"Recommendation(board={self.board!r}, boots={self.boots!r}, "
+                f"fasteners={self.fasteners!r}, helmet={self.helmet!r}{timed_out})")
+
+def match_board(user, boards):
+    if is_sorted_index(boards):
+        boards = boards.nearest((user.gender, user.skill), user.height, 10)
+    for board in boards:
+        if (board.gender == user.gender and
+            board.skill == user.skill and
+            board.height >= user.height - 10 and
+            board.height <= user.height + 10):
+            log_action(f"Recommended board: {board.name} for user {user.name}")
+            return board
+    return None
+
+def match_boots(user, boots):
+    if is_indexed(boots):
+        boots = boots.lookup(user.gender, user.skill, user.leg_size)
+    for boot in boots:
+        if (boot.gender == user.gender and
+            boot.skill == user.skill and
+            boot.leg_size == user.leg_size):
+            log_action(f"Recommended boots: {boot.name} for user {user.name}")
+            return boot
+    return None
+
+def match_fasteners(user, fasteners):
+    if is_indexed(fasteners):
+        fasteners = fasteners.lookup(user.gender, user.skill, user.fasteners)
+    for fastener in fasteners:
+        if (fastener.gender == user.gender and
+            fastener.skill == user.skill and
+            fastener.fasteners == user.fasteners):
+            log_action(f"Recommended fasteners: {fastener.name} for user {user.name}")
+            return fastener
+    return None
+
+def match_helmet(user, helmets):
+    if is_indexed(helmets):
+        helmets = helmets.lookup(user.gender, user.helmet_size)
+    for helmet in helmets:
+        if (helmet.gender == user.gender and
+            helmet.size == user.helmet_size):
+            log_action(f"Recommended helmet: {helmet.name} for user {user.name}")
+            return helmet
+    return None
+
+def recommend_equipment(user, boards, boots, fasteners, helmets):
+    """Подбор всех категорий без исключений: промахи отмечаются в результате"""
+    return Recommendation(board=match_board(user, boards),
+                          boots=match_boots(user, boots),
+                          fasteners=match_fasteners(user, fasteners),
+                          helmet=match_helmet(user, helmets))
+
+MATCHERS = {
+    "board": match_board,
+    "boots": match_boots,
+    "fasteners": match_fasteners,
+    "helmet": match_helmet,
+}
+
+USER_CACHE_FIELDS = {
+    "board": ("gender", "skill", "height"),
+    "boots": ("gender", "skill", "leg_size"),
+    "fasteners": ("gender", "skill", "fasteners"),
+    "helmet": ("gender", "helmet_size"),
+}
+
+BOARD_HEIGHT_BUCKET = 5
+
+class BoardWindow:
+    """Доски группы (gender, skill), подходящие хоть одному росту из интервала кеша.
+
+    Из серии досок одного роста хранятся только крайние: при движении к большему росту
+    nearest_positions берет первую, к меньшему - последнюю (так же упорядочен и nearest
+    у SQLite), поэтому выбор совпадает с match_board по полному индексу.
+    """
+
+    __slots__ = ("heights", "boards")
+
+    def __init__(self, boards):
+        self.heights = []
+        self.boards = []
+        for board in boards:
+            height = board.height
+            if len(self.heights) > 1 and self.heights[-2] == self.heights[-1] == height:
+                self.boards[-1] = board
+                continue
+            self.heights.append(height)
+            self.boards.append(board)
+
+    def nearest(self, height, tolerance=10):
+        position = next(nearest_positions(self.heights, height, tolerance), None)
+        return None if position is None else self.boards[position]
+
+class RecommendationCache:
+    """LRU-кеш подбора по полям пользователя с инвалидацией по версии множества снаряжения"""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, category, collection):
+        version = (id(collection), collection.version)
+        if self.versions.get(category) == version:
+            return
+        if category in self.versions:
+            stale = [key for key in self.entries if key[0] == category]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+        self.versions[category] = version
+
+    def match(self, category, user, collection):
+        if not is_indexed(collection):
+            return MATCHERS[category](user, collection)
+        self._check_version(category, collection)
+        if category == "board" and is_sorted_index(collection):
+            return self._match_board(user, collection)
+        key = (category,) + tuple(getattr(user, field) for field in USER_CACHE_FIELDS[category])
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            item = self.entries[key]
+            if item is not None:
+                log_action(f"Recommended {category}: {item.name} for user {user.name} (cached)")
+            return item
+        self.misses += 1
+        item = MATCHERS[category](user, collection)
+        self._store(key, item)
+        return item
+
+    def _match_board(self, user, boards):
+        # Ключ - интервал роста шириной BOARD_HEIGHT_BUCKET, а не точный рост пользователя
+        bucket = math.floor(user.height / BOARD_HEIGHT_BUCKET)
+        key = ("board", user.gender, user.skill, bucket)
+        window = self.entries.get(key)
+        if window is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            cached = " (cached)"
+        else:
+            self.misses += 1
+            low = bucket * BOARD_HEIGHT_BUCKET - 10
+            window = BoardWindow(boards.window((user.gender, user.skill), low, low + BOARD_HEIGHT_BUCKET + 20))
+            self._store(key, window)
+            cached = ""
+        board = window.nearest(user.height)
+        if board is not None:
+            log_action(f"Recommended board: {board.name} for user {user.name}{cached}")
+        return board
+
+    def _store(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.versions.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "invalidations": self.invalidations, "size": len(self.entries)}
+
+def _match(category, user, collection, cache):
+    if isinstance(collection, LockedCollection):
+        # Весь подбор идет под одной блокировкой чтения прямо по индексу, без копий
+        with collection.lock.reading():
+            return _match(category, user, collection.collection, cache)
+    if cache is None:
+        return MATCHERS[category](user, collection)
+    return cache.match(category, user, collection)
+
+def recommend_board(user, boards, cache=None):
+    return Recommendation(board=_match("board", user, boards, cache)).require("board")
+
+def recommend_boots(user, boots, cache=None):
+    return Recommendation(boots=_match("boots", user, boots, cache)).require("boots")
+
+def recommend_fasteners(user, fasteners, cache=None):
+    return Recommendation(fasteners=_match("fasteners", user, fasteners, cache)).require("fasteners")
+
+def recommend_helmet(user, helmets, cache=None):
+    return Recommendation(helmet=_match("helmet", user, helmets, cache)).require("helmet")
+
+class EquipmentCatalog:
+    """Каталог снаряжения: по одному индексированному множеству на категорию"""
+
+    def __init__(self, boards=None, boots=None, fasteners=None, helmets=None):
+        self.boards = SortedEquipmentIndex(board_key, "height") if boards is None else boards
+        self.boots = EquipmentIndex(boots_key) if boots is None else boots
+        self.fasteners = EquipmentIndex(fasteners_key) if fasteners is None else fasteners
+        self.helmets = EquipmentIndex(helmet_key) if helmets is None else helmets
+
+    def collection_for(self, item):
+        if isinstance(item, Board):
+            return self.boards
+        if isinstance(item, Boots):
+            return self.boots
+        if isinstance(item, Fasteners):
+            return self.fasteners
+        if isinstance(item, Helmet):
+            return self.helmets
+        raise InvalidInputError(f"Unsupported equipment type: {item.__class__.__name__}")
+
+    def add(self, item):
+        self.collection_for(item).add(item)
+        return item
+
+    def __iter__(self):
+        yield from self.boards
+        yield from self.boots
+        yield from self.fasteners
+        yield from self.helmets
+
+    def __len__(self):
+        return len(self.boards) + len(self.boots) + len(self.fasteners) + len(self.helmets)
+
+    def is_empty(self):
+        return len(self) == 0
+
+    def save(self, item):
+        """Сохранение измененного состояния позиции; объекты в памяти уже изменены на месте"""
+
+    @property
+    def version(self):
+        return (self.boards.version + self.boots.version +
+                self.fasteners.version + self.helmets.version)
+
+EQUIPMENT_DEFAULTS = {
+    Boots: {"comfort_level": "medium"},
+    Fasteners: {"adjustment": "medium"},
+    Helmet: {"ventilation": "open"},
+}
+
+def restore_equipment(cls, name, gender, skill, attribute, value, created_at):
+    """Восстановление объекта снаряжения из сохраненных полей без счетчика и логирования"""
+    item = cls.__new__(cls)
+    item.name = name
+    item.gender = gender
+    item.skill = skill
+    item.created_at = created_at
+    setattr(item, attribute, value)
+    for field, default in EQUIPMENT_DEFAULTS.get(cls, {}).items():
+        setattr(item, field, default)
+    return item
+
+class CategoryCodes:
+    """Словарь категориальной колонки: значение <-> однобайтовый код"""
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            if code > 255:
+                raise InvalidInputError("Too many distinct values for a categorical column.")
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, code):
+        return self.values[code]
+
+class EquipmentRow:
+    """Строка колоночного хранилища; объект Equipment создается только при выводе"""
+
+    __slots__ = ("store", "row", "item")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+        self.item = None
+
+    def __getattr__(self, name):
+        return self.store.value(self.row, name)
+
+    def materialize(self):
+        if self.item is None:
+            self.item = self.store.materialize(self.row)
+        return self.item
+
+    def __eq__(self, other):
+        return self.name == other.name and self.gender == other.gender
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.name, self.gender))
+
+    def __str__(self):
+        return str(self.materialize())
+
+    def __repr__(self):
+        return repr(self.materialize())
+
+    def format_info(self):
+        return self.materialize().format_info()
+
+    def get_usage_instructions(self):
+        return self.materialize().get_usage_instructions()
+
+    def calculate_rental_price(self, days):
+        return self.materialize().calculate_rental_price(days)
+
+def equipment_class(item):
+    if isinstance(item, EquipmentRow):
+        return item.store.cls
+    return type(item)
+
+class ColumnarIndex:
+    """Колоночное хранилище снаряжения одного типа: параллельные типизированные массивы
+    и категориальные коды для пола, уровня и размеров, хеш-индекс по ключевым колонкам"""
+
+    def __init__(self, cls, attribute, key_fields, categorical=False, items=()):
+        self.cls = cls
+        self.attribute = attribute
+        self.key_fields = key_fields
+        self.categorical = categorical
+        self.names = []
+        self.genders = array("B")
+        self.skills = array("B")
+        self.values = array("B" if categorical else "d")
+        self.created = array("d")
+        self.gender_codes = CategoryCodes()
+        self.skill_codes = CategoryCodes()
+        self.value_codes = CategoryCodes() if categorical else None
+        self.members = {}
+        self.buckets = {}
+        self.version = 0
+        self.listeners = []
+        for item in items:
+            self.add(item)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        for row in range(len(self.names)):
+            yield EquipmentRow(self, row)
+
+    def __contains__(self, item):
+        gender_code = self.gender_codes.codes.get(item.gender)
+        return gender_code is not None and item.name in self.members.get(gender_code, {})
+
+    def add(self, item):
+        self.append(item.name, item.gender, item.skill, getattr(item, self.attribute), item.created_at)
+
+    def append(self, name, gender, skill, value, created_at=None):
+        gender_code = self.gender_codes.encode(gender)
+        names = self.members.setdefault(gender_code, {})
+        if name in names:
+            return
+        row = len(self.names)
+        names[name] = row
+        self.names.append(name)
+        self.genders.append(gender_code)
+        self.skills.append(self.skill_codes.encode(skill))
+        self.values.append(self.value_codes.encode(value) if self.categorical else value)
+        self.created.append((created_at or datetime.now()).timestamp())
+        self._insert(tuple(self.value(row, field) for field in self.key_fields), row)
+        self.version += 1
+        for listener in self.listeners:
+            listener("add", EquipmentRow(self, row))
+
+    def _insert(self, bucket_key, row):
+        bucket = self.buckets.get(bucket_key)
+        if bucket is None:
+            bucket = self.buckets[bucket_key] = array("I")
+        bucket.append(row)
+
+    def value(self, row, field):
+        if field == "name":
+            return self.names[row]
+        if field == "gender":
+            return self.gender_codes.decode(self.genders[row])
+        if field == "skill":
+            return self.skill_codes.decode(self.skills[row])
+        if field == self.attribute:
+            value = self.values[row]
+            return self.value_codes.decode(value) if self.categorical else value
+        if field == "created_at":
+            return datetime.fromtimestamp(self.created[row])
+        raise AttributeError(f"Attribute '{field}' does not exist in the object.")
+
+    def column(self, field):
+        """Сырая колонка: массив значений или кодов"""
+        columns = {"name": self.names, "gender": self.genders, "skill": self.skills,
+                   self.attribute: self.values, "created_at": self.created}
+        if field not in columns:
+            raise AttributeError(f"Attribute '{field}' does not exist in the object.")
+        return columns[field]
+
+    def materialize(self, row):
+        return restore_equipment(self.cls, self.value(row, "name"), self.value(row, "gender"),
+                                 self.value(row, "skill"), self.attribute,
+                                 self.value(row, self.attribute), self.value(row, "created_at"))
+
+    def lookup(self, *key):
+        return [EquipmentRow(self, row) for row in self.buckets.get(key, ())]
+
+    def bucket_keys(self):
+        return self.buckets.keys()
+
+class SortedColumnarIndex(ColumnarIndex):
+    """Колоночное хранилище с группами, отсортированными по числовой колонке"""
+
+    def __init__(self, cls, attribute, key_fields, items=()):
+        self.sorted_values = {}
+        super().__init__(cls, attribute, key_fields, False, items)
+
+    def _insert(self, bucket_key, row):
+        values = self.sorted_values.get(bucket_key)
+        if values is None:
+            values = self.sorted_values[bucket_key] = array("d")
+            self.buckets[bucket_key] = array("I")
+        value = self.values[row]
+        position = bisect_right(values, value)
+        values.insert(position, value)
+        self.buckets[bucket_key].insert(position, row)
+
+    def window(self, bucket_key, low, high):
+        values = self.sorted_values.get(bucket_key)
+        if not values:
+            return []
+        start = bisect_left(values, low)
+        stop = bisect_right(values, high, start)
+        return [EquipmentRow(self, row) for row in self.buckets[bucket_key][start:stop]]
+
+    def nearest(self, bucket_key, center, tolerance):
+        values = self.sorted_values.get(bucket_key)
+        if not values:
+            return []
+        bucket = self.buckets[bucket_key]
+        return [EquipmentRow(self, bucket[position])
+                for position in nearest_positions(values, center, tolerance)]
+
+class ColumnarCatalog(EquipmentCatalog):
+    """Каталог на колоночных хранилищах с тем же интерфейсом, что и EquipmentCatalog"""
+
+    def __init__(self):
+        super().__init__(
+            boards=SortedColumnarIndex(Board, "height", ("gender", "skill")),
+            boots=ColumnarIndex(Boots, "leg_size", ("gender", "skill", "leg_size")),
+            fasteners=ColumnarIndex(Fasteners, "fasteners", ("gender", "skill", "fasteners"), categorical=True),
+            helmets=ColumnarIndex(Helmet, "size", ("gender", "size"), categorical=True),
+        )
+
+CATALOG_DB = 'equipment_catalog.db'
+
+STATE_FIELDS = {Boots: "comfort_level", Fasteners: "adjustment", Helmet: "ventilation"}
+
+class SQLiteTable:
+    """Таблица SQLite для снаряжения одного типа с интерфейсом EquipmentIndex:
+    lookup и bucket_keys выполняются индексированными SQL-запросами"""
+
+    def __init__(self, database, cls, table, attribute, column_type, key_fields):
+        self.database = database
+        self.cls = cls
+        self.table = table
+        self.attribute = attribute
+        self.column_type = column_type
+        self.key_fields = key_fields
+        self.state_field = STATE_FIELDS.get(cls)
+        self.listeners = []
+        self.changes = 0
+        self.columns = ["name", "gender", "skill", attribute, "created_at"]
+        if self.state_field:
+            self.columns.append(self.state_field)
+        self.select = f"SELECT {', '.join(self.columns)} FROM {table}"
+
+    def schema(self):
+        state = f", {self.state_field} TEXT" if self.state_field else ""
+        return [
+            f"CREATE TABLE IF NOT EXISTS {self.table} (name TEXT NOT NULL, gender TEXT NOT NULL, "
+            f"skill TEXT NOT NULL, {self.attribute} {self.column_type} NOT NULL, "
+            f"created_at REAL NOT NULL{state}, PRIMARY KEY (name, gender))",
+            f"CREATE INDEX IF NOT EXISTS {self.table}_lookup ON {self.table} ({', '.join(self.key_fields_with_attribute())})",
+        ]
+
+    def key_fields_with_attribute(self):
+        fields = list(self.key_fields)
+        if self.attribute not in fields:
+            fields.append(self.attribute)
+        return fields
+
+    @property
+    def version(self):
+        return self.changes + self.database.data_version()
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def _row_values(self, item):
+        values = [item.name, item.gender, item.skill, getattr(item, self.attribute),
+                  item.created_at.timestamp()]
+        if self.state_field:
+            values.append(getattr(item, self.state_field))
+        return values
+
+    def _restore(self, row):
+        value = row[3]
+        if isinstance(value, float) and value.is_integer():
+            # REAL-колонка возвращает 170.0 для роста 170: целые значения выводятся как без SQLite
+            value = int(value)
+        item = restore_equipment(self.cls, row[0], row[1], row[2], self.attribute, value,
+                                 datetime.fromtimestamp(row[4]))
+        if self.state_field:
+            setattr(item, self.state_field, row[5])
+        return item
+
+    def add(self, item):
+        self.add_many([item])
+
+    def add_many(self, items):
+        placeholders = ", ".join("?" for _ in self.columns)
+        statement = f"INSERT OR IGNORE INTO {self.table} ({', '.join(self.columns)}) VALUES ({placeholders})"
+        added = []
+        connection = self.database.connection()
+        with connection:
+            for item in items:
+                if connection.execute(statement, self._row_values(item)).rowcount:
+                    added.append(item)
+        self.changes += len(added)
+        for item in added:
+            for listener in self.listeners:
+                listener("add", item)
+        return len(added)
+
+    def save(self, item):
+        """Сохранение изменений позиции, например после adjust_comfort"""
+        placeholders = ", ".join("?" for _ in self.columns)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in self.columns[2:])
+        with self.database.connection() as connection:
+            connection.execute(f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES ({placeholders}) "
+                               f"ON CONFLICT (name, gender) DO UPDATE SET {updates}", self._row_values(item))
+        self.changes += 1
+
+    def discard(self, item):
+        with self.database.connection() as connection:
+            removed = connection.execute(f"DELETE FROM {self.table} WHERE name = ? AND gender = ?",
+                                         (item.name, item.gender)).rowcount
+        if removed:
+            self.changes += 1
+            for listener in self.listeners:
+                listener("discard", item)
+
+    def _query(self, where="", parameters=(), order="rowid"):
+        sql = f"{self.select}{' WHERE ' + where if where else ''} ORDER BY {order}"
+        return [self._restore(row) for row in self.database.connection().execute(sql, parameters)]
+
+    def __iter__(self):
+        cursor = self.database.connection().execute(f"{self.select} ORDER BY rowid")
+        for row in cursor:
+            yield self._restore(row)
+
+    def __len__(self):
+        return self.database.connection().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def __contains__(self, item):
+        return self.database.connection().execute(
+            f"SELECT 1 FROM {self.table} WHERE name = ? AND gender = ?", (item.name, item.gender)
+        ).fetchone() is not None
+
+    def lookup(self, *key):
+        return self._query(" AND ".join(f"{field} = ?" for field in self.key_fields), key)
+
+    def bucket_keys(self):
+        fields = ", ".join(self.key_fields)
+        return [tuple(row) for row in self.database.connection().execute(
+            f"SELECT DISTINCT {fields} FROM {self.table}")]
+
+class SortedSQLiteTable(SQLiteTable):
+    """Таблица SQLite с окнами по числовому атрибуту, как у SortedEquipmentIndex"""
+
+    def _key_where(self):
+        return " AND ".join(f"{field} = ?" for field in self.key_fields)
+
+    def window(self, bucket_key, low, high):
+        return self._query(f"{self._key_where()} AND {self.attribute} BETWEEN ? AND ?",
+                           tuple(bucket_key) + (low, high), f"{self.attribute}, rowid")
+
+    def nearest(self, bucket_key, center, tolerance):
+        # Тот же порядок, что у nearest_positions: при равном удалении - меньший рост, из серии
+        # равных ниже center - последняя добавленная, не ниже center - первая
+        return self._query(f"{self._key_where()} AND {self.attribute} BETWEEN ? AND ?",
+                           tuple(bucket_key) + (center - tolerance, center + tolerance, center, center),
+                           f"ABS({self.attribute} - ?), {self.attribute}, "
+                           f"CASE WHEN {self.attribute} < ? THEN -rowid ELSE rowid END")
+
+class SQLiteCatalog(EquipmentCatalog):
+    """Постоянный каталог в SQLite (режим WAL): таблица на тип снаряжения и индексы
+    по (gender, skill, размер/рост). У каждого потока свое соединение."""
+
+    def __init__(self, path=CATALOG_DB):
+        self.path = path
+        self.local = threading.local()
+        super().__init__(
+            boards=SortedSQLiteTable(self, Board, "boards", "height", "REAL", ("gender", "skill")),
+            boots=SQLiteTable(self, Boots, "boots", "leg_size", "REAL", ("gender", "skill", "leg_size")),
+            fasteners=SQLiteTable(self, Fasteners, "fasteners", "fasteners", "TEXT", ("gender", "skill", "fasteners")),
+            helmets=SQLiteTable(self, Helmet, "helmets", "size", "TEXT", ("gender", "size")),
+        )
+        with self.connection() as connection:
+            for table in self.tables():
+                for statement in table.schema():
+                    connection.execute(statement)
+
+    def tables(self):
+        return (self.boards, self.boots, self.fasteners, self.helmets)
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def data_version(self):
+        return self.connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def save(self, item):
+        self.collection_for(item).save(item)
+
+    def import_items(self, items):
+        """Загрузка позиций пачками по типам, одна транзакция на тип"""
+        groups = {}
+        for item in items:
+            groups.setdefault(id(self.collection_for(item)), (self.collection_for(item), []))[1].append(item)
+        return sum(table.add_many(table_items) for table, table_items in groups.values())
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+SNAPSHOT_MAGIC = b"EQSNAP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<6sHI")
+SNAPSHOT_ENTRY = struct.Struct("<16sQ")
+SNAPSHOT_SECTION = struct.Struct("<III")
+
+# Таблица, класс, атрибут, категориальный ли атрибут, ключевые поля индекса
+SNAPSHOT_LAYOUT = (
+    ("boards", Board, "height", False, ("gender", "skill")),
+    ("boots", Boots, "leg_size", False, ("gender", "skill", "leg_size")),
+    ("fasteners", Fasteners, "fasteners", True, ("gender", "skill", "fasteners")),
+    ("helmets", Helmet, "size", True, ("gender", "size")),
+)
+
+def _align(offset, size=8):
+    return (offset + size - 1) // size * size
+
+def _encode_section(items, attribute, categorical, key_fields):
+    vocab = {"gender": [], "skill": [], "value": [] if categorical else None}
+    codes = {field: {} for field in vocab}
+
+    def encode(field, value):
+        table = codes[field]
+        if value not in table:
+            if len(table) > 255:
+                raise InvalidInputError(f"Too many distinct values for {field} in snapshot.")
+            table[value] = len(vocab[field])
+            vocab[field].append(value)
+        return table[value]
+
+    rows = []
+    for item in items:
+        value = getattr(item, attribute)
+        rows.append((encode("gender", item.gender), encode("skill", item.skill),
+                     encode("value", value) if categorical else float(value),
+                     item.created_at.timestamp(), item.name.encode("utf-8")))
+    sort_fields = [("gender", "skill", "value").index("value" if field == attribute else field)
+                   for field in key_fields]
+    if attribute not in key_fields:
+        sort_fields.append(2)
+    rows.sort(key=lambda row: tuple(row[position] for position in sort_fields))
+
+    count = len(rows)
+    vocab_bytes = json.dumps(vocab).encode("utf-8")
+    names = b"".join(row[4] for row in rows)
+    offsets = array("I", [0])
+    for row in rows:
+        offsets.append(offsets[-1] + len(row[4]))
+    parts = [SNAPSHOT_SECTION.pack(count, len(vocab_bytes), len(names)), vocab_bytes]
+    size = SNAPSHOT_SECTION.size + len(vocab_bytes)
+    for column in (array("d", [row[3] for row in rows]),
+                   array("B" if categorical else "d", [row[2] for row in rows]),
+                   array("B", [row[0] for row in rows]),
+                   array("B", [row[1] for row in rows]),
+                   offsets):
+        padding = _align(size, column.itemsize) - size
+        parts.append(b"\0" * padding)
+        parts.append(column.tobytes())
+        size += padding + len(column) * column.itemsize
+    parts.append(names)
+    return b"".join(parts)
+
+def snapshot_parts(catalog):
+    """Каталог в формате снимка: список фрагментов (заголовок, выровненные секции) для записи подряд"""
+    sections = [_encode_section(getattr(catalog, table), attribute, categorical, key_fields)
+                for table, _, attribute, categorical, key_fields in SNAPSHOT_LAYOUT]
+    offset = _align(SNAPSHOT_HEADER.size + SNAPSHOT_ENTRY.size * len(sections))
+    header = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(sections))]
+    body = []
+    for (table, *_), section in zip(SNAPSHOT_LAYOUT, sections):
+        header.append(SNAPSHOT_ENTRY.pack(table.encode("ascii"), offset))
+        padded = section + b"\0" * (_align(len(section)) - len(section))
+        body.append(padded)
+        offset += len(padded)
+    header = b"".join(header)
+    return [header + b"\0" * (_align(len(header)) - len(header))] + body
+
+def write_snapshot(catalog, path):
+    """Запись каталога в версионированный бинарный снимок (атомарно, через временный файл)"""
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as snapshot:
+        for part in snapshot_parts(catalog):
+            snapshot.write(part)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.replace(temporary, path)
+    log_action(f"Snapshot written: {path}")
+
+class MappedRows:
+    """Ленивый диапазон строк снимка: EquipmentRow создается только при обращении"""
+
+    def __init__(self, category, start, stop):
+        self.category = category
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        return EquipmentRow(self.category, self.start + index)
+
+    def __iter__(self):
+        for row in range(self.start, self.stop):
+            yield EquipmentRow(self.category, row)
+
+class _SortKeys:
+    """Ленивая последовательность ключей сортировки строк снимка для bisect"""
+
+    def __init__(self, category):
+        self.category = category
+
+    def __len__(self):
+        return self.category.count
+
+    def __getitem__(self, row):
+        return self.category.sort_key(row)
+
+class MappedCategory:
+    """Секция снимка, открытая через mmap: колонки читаются прямо из отображенного буфера.
+
+    Строки в секции отсортированы по ключу индекса, поэтому lookup - это двоичный поиск.
+    Интерфейс совпадает с хранилищем для EquipmentRow и с EquipmentIndex для рекомендаций.
+    """
+
+    def __init__(self, buffer, offset, cls, attribute, categorical, key_fields):
+        self.cls = cls
+        self.attribute = attribute
+        self.categorical = categorical
+        self.key_fields = key_fields
+        self.version = 0
+        self.count, vocab_length, names_length = SNAPSHOT_SECTION.unpack_from(buffer, offset)
+        position = offset + SNAPSHOT_SECTION.size
+        vocab = json.loads(bytes(buffer[position:position + vocab_length]))
+        position += vocab_length
+        self.genders_vocab = vocab["gender"]
+        self.skills_vocab = vocab["skill"]
+        self.values_vocab = vocab["value"]
+        self.codes = {
+            "gender": {value: code for code, value in enumerate(self.genders_vocab)},
+            "skill": {value: code for code, value in enumerate(self.skills_vocab)},
+            attribute: ({value: code for code, value in enumerate(self.values_vocab)}
+                        if categorical else None),
+        }
+        columns = []
+        for format_char, length in (("d", self.count), ("B" if categorical else "d", self.count),
+                                    ("B", self.count), ("B", self.count), ("I", self.count + 1)):
+            itemsize = array(format_char).itemsize
+            position = _align(position, itemsize)
+            columns.append(buffer[position:position + length * itemsize].cast(format_char))
+            position += length * itemsize
+        self.created, self.values, self.genders, self.skills, self.name_offsets = columns
+        self.names = buffer[position:position + names_length]
+        self.sort_fields = list(key_fields) + ([] if attribute in key_fields else [attribute])
+        self.keys = _SortKeys(self)
+
+    def _column_value(self, field, row):
+        if field == "gender":
+            return self.genders[row]
+        if field == "skill":
+            return self.skills[row]
+        return self.values[row]
+
+    def sort_key(self, row):
+        return tuple(self._column_value(field, row) for field in self.sort_fields)
+
+    def encode_key(self, key):
+        encoded = []
+        for field, value in zip(self.sort_fields, key):
+            table = self.codes.get(field)
+            if table is None:
+                encoded.append(value)
+            elif value in table:
+                encoded.append(table[value])
+            else:
+                return None
+        return tuple(encoded)
+
+    def value(self, row, field):
+        if field == "name":
+            return str(self.names[self.name_offsets[row]:self.name_offsets[row + 1]], "utf-8")
+        if field == "gender":
+            return self.genders_vocab[self.genders[row]]
+        if field == "skill":
+            return self.skills_vocab[self.skills[row]]
+        if field == self.attribute:
+            value = self.values[row]
+            return self.values_vocab[value] if self.categorical else value
+        if field == "created_at":
+            return datetime.fromtimestamp(self.created[row])
+        raise AttributeError(f"Attribute '{field}' does not exist in the object.")
+
+    def materialize(self, row):
+        return restore_equipment(self.cls, self.value(row, "name"), self.value(row, "gender"),
+                                 self.value(row, "skill"), self.attribute,
+                                 self.value(row, self.attribute), self.value(row, "created_at"))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for row in range(self.count):
+            yield EquipmentRow(self, row)
+
+    def _range(self, prefix):
+        start = bisect_left(self.keys, prefix)
+        upper = prefix + (float("inf"),) * (len(self.sort_fields) - len(prefix))
+        return start, bisect_right(self.keys, upper, start)
+
+    def lookup(self, *key):
+        encoded = self.encode_key(key)
+        if encoded is None:
+            return []
+        return MappedRows(self, *self._range(encoded))
+
+    def bucket_keys(self):
+        width = len(self.key_fields)
+        row = 0
+        while row < self.count:
+            prefix = self.sort_key(row)[:width]
+            yield tuple(self.value(row, field) for field in self.key_fields)
+            row = self._range(prefix)[1]
+
+    def subscribe(self, listener):
+        pass
+
+    def add(self, item):
+        raise InvalidInputError("Snapshot catalogs are read-only.")
+
+class SortedMappedCategory(MappedCategory):
+    """Секция досок: внутри (gender, skill) строки отсортированы по росту"""
+
+    def window(self, bucket_key, low, high):
+        encoded = self.encode_key(bucket_key)
+        if encoded is None:
+            return []
+        start = bisect_left(self.keys, encoded + (low,))
+        stop = bisect_right(self.keys, encoded + (high,), start)
+        return MappedRows(self, start, stop)
+
+    def nearest(self, bucket_key, center, tolerance):
+        encoded = self.encode_key(bucket_key)
+        if encoded is None:
+            return []
+        start, stop = self._range(encoded)
+        heights = self.values[start:stop]
+        return (EquipmentRow(self, start + position)
+                for position in nearest_positions(heights, center, tolerance))
+
+class MappedCatalog(EquipmentCatalog):
+    """Каталог только для чтения поверх снимка, открытого через mmap"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._map_sections(memoryview(self.mapping))
+
+    @classmethod
+    def from_buffer(cls, buffer, source):
+        """Снимок в уже отображенной памяти, например в сегменте shared_memory; буфер не копируется"""
+        catalog = cls.__new__(cls)
+        catalog.path = source
+        catalog.file = catalog.mapping = None
+        catalog._map_sections(memoryview(buffer))
+        return catalog
+
+    def _map_sections(self, buffer):
+        self.buffer = buffer
+        magic, version, sections = SNAPSHOT_HEADER.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise InvalidInputError(f"{self.path} is not an equipment snapshot.")
+        if version != SNAPSHOT_VERSION:
+            raise InvalidInputError(f"Unsupported snapshot version {version} in {self.path}.")
+        offsets = {}
+        for index in range(sections):
+            table, offset = SNAPSHOT_ENTRY.unpack_from(buffer, SNAPSHOT_HEADER.size + index * SNAPSHOT_ENTRY.size)
+            offsets[table.rstrip(b"\0").decode("ascii")] = offset
+        categories = {}
+        for table, cls, attribute, categorical, key_fields in SNAPSHOT_LAYOUT:
+            category_class = SortedMappedCategory if cls is Board else MappedCategory
+            categories[table] = category_class(buffer, offsets[table], cls, attribute, categorical, key_fields)
+        super().__init__(**categories)
+
+    def close(self):
+        for table, *_ in SNAPSHOT_LAYOUT:
+            category = getattr(self, table)
+            for column in (category.created, category.values, category.genders,
+                           category.skills, category.name_offsets, category.names):
+                column.release()
+        self.buffer.release()
+        if self.mapping is not None:
+            self.mapping.close()
+            self.file.close()
+
+SNAPSHOT_FILE = "equipment_catalog.snap"
+JOURNAL_FILE = "equipment_catalog.journal"
+JOURNAL_COMPACT_BYTES = 4 * 2 ** 20
+JOURNAL_RECORD = struct.Struct("<II")   # длина полезной нагрузки, crc32 полезной нагрузки
+JOURNAL_OP = struct.Struct("<BB")       # операция, номер категории в SNAPSHOT_LAYOUT
+JOURNAL_STRING = struct.Struct("<H")
+JOURNAL_FLOAT = struct.Struct("<d")
+JOURNAL_ADD, JOURNAL_DISCARD, JOURNAL_SAVE, JOURNAL_CLEAR = range(4)
+
+def _pack_string(value):
+    data = str(value).encode("utf-8")
+    return JOURNAL_STRING.pack(len(data)) + data
+
+def _unpack_string(payload, offset):
+    (length,) = JOURNAL_STRING.unpack_from(payload, offset)
+    offset += JOURNAL_STRING.size
+    return str(payload[offset:offset + length], "utf-8"), offset + length
+
+def _unpack_float(payload, offset):
+    return JOURNAL_FLOAT.unpack_from(payload, offset)[0], offset + JOURNAL_FLOAT.size
+
+def encode_mutation(op, category, item=None):
+    """Запись журнала: заголовок (длина, crc32) и полезная нагрузка с операцией и полями позиции"""
+    _, cls, attribute, categorical, _ = SNAPSHOT_LAYOUT[category]
+    parts = [JOURNAL_OP.pack(op, category)]
+    if op != JOURNAL_CLEAR:
+        parts += [_pack_string(item.name), _pack_string(item.gender)]
+    if op == JOURNAL_ADD:
+        value = getattr(item, attribute)
+        parts += [_pack_string(item.skill),
+                  _pack_string(value) if categorical else JOURNAL_FLOAT.pack(value),
+                  JOURNAL_FLOAT.pack(item.created_at.timestamp())]
+    if op in (JOURNAL_ADD, JOURNAL_SAVE) and cls in STATE_FIELDS:
+        parts.append(_pack_string(getattr(item, STATE_FIELDS[cls])))
+    payload = b"".join(parts)
+    return JOURNAL_RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+
+def apply_mutation(catalog, payload):
+    op, category = JOURNAL_OP.unpack_from(payload, 0)
+    table, cls, attribute, categorical, _ = SNAPSHOT_LAYOUT[category]
+    collection = getattr(catalog, table)
+    if op == JOURNAL_CLEAR:
+        collection.clear()
+        return
+    name, offset = _unpack_string(payload, JOURNAL_OP.size)
+    gender, offset = _unpack_string(payload, offset)
+    # Позиции сравниваются по (name, gender), поэтому для поиска хватает "пустой" позиции
+    probe = restore_equipment(cls, name, gender, None, attribute, None, None)
+    if op == JOURNAL_DISCARD:
+        collection.discard(probe)
+        return
+    if op == JOURNAL_ADD:
+        if probe in collection:
+            return
+        skill, offset = _unpack_string(payload, offset)
+        value, offset = (_unpack_string if categorical else _unpack_float)(payload, offset)
+        created_at, offset = _unpack_float(payload, offset)
+        item = restore_equipment(cls, name, gender, skill, attribute, value, datetime.fromtimestamp(created_at))
+    elif op == JOURNAL_SAVE:
+        item = collection.members.get(probe)
+        if item is None:
+            return
+    else:
+        raise InvalidInputError(f"Unknown journal operation: {op}")
+    if cls in STATE_FIELDS:
+        setattr(item, STATE_FIELDS[cls], _unpack_string(payload, offset)[0])
+    if op == JOURNAL_ADD:
+        collection.add(item)
+
+def replay_journal(path, catalog):
+    """Применяет записи журнала к каталогу. Оборванный при сбое хвост (неполная запись
+    или несовпадение crc32) отбрасывается и обрезается. Возвращает число примененных записей."""
+    applied = 0
+    with open(path, "r+b") as file:
+        data = memoryview(file.read())
+        offset = 0
+        while offset + JOURNAL_RECORD.size <= len(data):
+            length, checksum = JOURNAL_RECORD.unpack_from(data, offset)
+            start = offset + JOURNAL_RECORD.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            apply_mutation(catalog, payload)
+            applied += 1
+            offset = start + length
+        if offset < len(data):
+            log_action(f"Journal {path}: discarded {len(data) - offset} bytes of torn tail")
+            file.truncate(offset)
+    return applied
+
+class MutationJournal:
+    """Журнал мутаций только на дозапись с групповым fsync.
+
+    append только ставит запись в очередь; commit ждет, пока она окажется на диске.
+    Первый ожидающий поток пишет и синхронизирует всю накопленную пачку за всех,
+    остальные ждут его, так что одновременные записи делят один fsync.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+        self.lock = threading.Lock()
+        self.synced = threading.Condition(self.lock)
+        self.pending = []
+        self.appended = 0
+        self.durable = 0
+        self.syncing = False
+        self.size = self.file.tell()
+        self.fsyncs = 0
+
+    def append(self, record):
+        with self.lock:
+            self.pending.append(record)
+            self.appended += 1
+            self.size += len(record)
+            return self.appended
+
+    def commit(self, sequence=None):
+        with self.lock:
+            target = self.appended if sequence is None else sequence
+            while self.durable < target:
+                if self.syncing:
+                    self.synced.wait()
+                    continue
+                self.syncing = True
+                batch, self.pending = self.pending, []
+                last = self.appended
+                self.lock.release()
+                try:
+                    self.file.write(b"".join(batch))
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+                finally:
+                    self.lock.acquire()
+                    self.syncing = False
+                    self.synced.notify_all()
+                self.durable = last
+                self.fsyncs += 1
+
+    def record(self, record):
+        self.commit(self.append(record))
+
+    def close(self):
+        self.commit()
+        self.file.close()
+
+class JournaledCatalog(EquipmentCatalog):
+    """Каталог в памяти, который переживает перезапуск: состояние - последний снимок
+    плюс журнал мутаций поверх него.
+
+    Добавления и удаления журналируются через подписку на события коллекций, изменения
+    состояния позиции (adjust_comfort, adjust_tightness, adjust_ventilation) - вызовом save.
+    Когда журнал превышает compact_bytes, он сворачивается в новый снимок в фоновом потоке.
+    """
+
+    def __init__(self, snapshot_path=SNAPSHOT_FILE, journal_path=JOURNAL_FILE,
+                 compact_bytes=JOURNAL_COMPACT_BYTES):
+        super().__init__()
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compacting_path = f"{journal_path}.compacting"
+        self.compact_bytes = compact_bytes
+        self.compaction = None
+        self.compactions = 0
+        self.deferred = threading.local()
+        start = time.perf_counter()
+        self.replaying = True
+        self.loaded = self._load_snapshot()
+        self.replayed = 0
+        # Сегмент .compacting остается, если процесс упал до записи нового снимка
+        for path in (self.compacting_path, self.journal_path):
+            if os.path.exists(path):
+                self.replayed += replay_journal(path, self)
+        self.replaying = False
+        self.replay_seconds = time.perf_counter() - start
+        self.journal = MutationJournal(journal_path)
+        for category, collection in enumerate(self.tables()):
+            collection.subscribe(lambda event, item, category=category: self._on_change(category, event, item))
+        log_action(f"Catalog restored: {self.loaded} items from {snapshot_path}, "
+                   f"{self.replayed} journal records in {self.replay_seconds:.2f} s")
+        if os.path.exists(self.compacting_path):
+            self.compact(wait=True)
+
+    def tables(self):
+        return (self.boards, self.boots, self.fasteners, self.helmets)
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return 0
+        snapshot = MappedCatalog(self.snapshot_path)
+        try:
+            loaded = 0
+            for table, *_ in SNAPSHOT_LAYOUT:
+                category = getattr(snapshot, table)
+                collection = getattr(self, table)
+                for row in range(len(category)):
+                    collection.add(category.materialize(row))
+                loaded += len(category)
+        finally:
+            snapshot.close()
+        return loaded
+
+    def _record(self, record):
+        if getattr(self.deferred, "batch", False):
+            self.journal.append(record)
+        else:
+            self.journal.record(record)
+        if self.journal.size >= self.compact_bytes and not self.compacting():
+            self.compact()
+
+    def _on_change(self, category, event, item):
+        if self.replaying:
+            return
+        op = {"add": JOURNAL_ADD, "discard": JOURNAL_DISCARD, "clear": JOURNAL_CLEAR}[event]
+        self._record(encode_mutation(op, category, item))
+
+    def save(self, item):
+        """Журналирование изменившегося состояния позиции, например после adjust_comfort"""
+        collection = self.collection_for(item)
+        if item in collection and type(item) in STATE_FIELDS:
+            category = next(index for index, table in enumerate(self.tables()) if table is collection)
+            self._record(encode_mutation(JOURNAL_SAVE, category, item))
+
+    @contextmanager
+    def batch(self):
+        """Записи внутри блока ставятся в очередь и синхронизируются одним fsync на выходе"""
+        self.deferred.batch = True
+        try:
+            yield self
+        finally:
+            self.deferred.batch = False
+            self.journal.commit()
+
+    def compacting(self):
+        return self.compaction is not None and self.compaction.is_alive()
+
+    def _rotate(self):
+        """Переносит текущий сегмент журнала в .compacting. Сегмент, оставшийся от неудавшейся
+        свертки, не затирается: текущие записи дописываются в его конец"""
+        self.journal.close()
+        if os.path.exists(self.compacting_path):
+            with open(self.journal_path, "rb") as segment, open(self.compacting_path, "ab") as pending:
+                shutil.copyfileobj(segment, pending)
+                pending.flush()
+                os.fsync(pending.fileno())
+            os.remove(self.journal_path)
+        else:
+            os.replace(self.journal_path, self.compacting_path)
+        self.journal = MutationJournal(self.journal_path)
+
+    def compact(self, wait=False):
+        """Сворачивает журнал в новый снимок. Копия каталога и новый сегмент журнала создаются
+        сразу в вызывающем потоке; снимок пишется в фоне, после чего старый сегмент удаляется."""
+        if self.compaction is not None:
+            self.compaction.join()
+        frozen = EquipmentCatalog(*(list(collection) for collection in self.tables()))
+        self._rotate()
+        # В снимке нет полей состояния, поэтому измененное состояние переносится в новый сегмент
+        for category, collection in enumerate(self.tables()):
+            cls = SNAPSHOT_LAYOUT[category][1]
+            if cls not in STATE_FIELDS:
+                continue
+            field = STATE_FIELDS[cls]
+            default = EQUIPMENT_DEFAULTS[cls][field]
+            for item in collection:
+                if getattr(item, field) != default:
+                    self.journal.append(encode_mutation(JOURNAL_SAVE, category, item))
+        self.journal.commit()
+
+        def fold():
+            write_snapshot(frozen, self.snapshot_path)
+            os.remove(self.compacting_path)
+            self.compactions += 1
+
+        self.compaction = threading.Thread(target=fold, name="journal-compaction", daemon=True)
+        self.compaction.start()
+        if wait:
+            self.compaction.join()
+
+    def close(self):
+        if self.compaction is not None:
+            self.compaction.join()
+        self.journal.close()
+
+class ReadWriteLock:
+    """Блокировка "много читателей или один писатель" с приоритетом писателей.
+
+    Повторный захват чтения тем же потоком не блокируется, даже если ждет писатель,
+    а поток-писатель может читать, не отпуская запись.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition(threading.Lock())
+        self.readers = 0
+        self.writer = None
+        self.writers_waiting = 0
+        self.local = threading.local()
+
+    def acquire_read(self):
+        depth = getattr(self.local, "depth", 0)
+        if depth or self.writer == threading.get_ident():
+            self.local.depth = depth + 1
+            return
+        with self.condition:
+            while self.writer is not None or self.writers_waiting:
+                self.condition.wait()
+            self.readers += 1
+        self.local.depth = 1
+
+    def release_read(self):
+        self.local.depth -= 1
+        if self.local.depth or self.writer == threading.get_ident():
+            return
+        with self.condition:
+            self.readers -= 1
+            if not self.readers:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        with self.condition:
+            self.writers_waiting += 1
+            try:
+                while self.writer is not None or self.readers:
+                    self.condition.wait()
+            finally:
+                self.writers_waiting -= 1
+            self.writer = threading.get_ident()
+
+    def release_write(self):
+        with self.condition:
+            self.writer = None
+            self.condition.notify_all()
+
+    @contextmanager
+    def reading(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def writing(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+class LockedCollection:
+    """Коллекция снаряжения под общей ReadWriteLock каталога.
+
+    Изменения идут под блокировкой записи, поэтому индекс, версия и подписчики (PriceTable,
+    журнал) обновляются атомарно. Итерация держит блокировку чтения до конца обхода
+    и ничего не копирует; подбор через recommend_* делает то же самое (см. _match).
+    """
+
+    def __init__(self, collection, lock):
+        self.collection = collection
+        self.lock = lock
+
+    @property
+    def version(self):
+        return self.collection.version
+
+    def __iter__(self):
+        with self.lock.reading():
+            yield from self.collection
+
+    def __len__(self):
+        with self.lock.reading():
+            return len(self.collection)
+
+    def __contains__(self, item):
+        with self.lock.reading():
+            return item in self.collection
+
+    def add(self, item):
+        with self.lock.writing():
+            self.collection.add(item)
+
+    def add_many(self, items):
+        with self.lock.writing():
+            add_many = getattr(self.collection, "add_many", None)
+            if add_many is not None:
+                return add_many(items)
+            for item in items:
+                self.collection.add(item)
+            return len(items)
+
+    def discard(self, item):
+        with self.lock.writing():
+            self.collection.discard(item)
+
+    def clear(self):
+        with self.lock.writing():
+            self.collection.clear()
+
+    def subscribe(self, listener):
+        with self.lock.writing():
+            self.collection.subscribe(listener)
+
+class ConcurrentCatalog(EquipmentCatalog):
+    """Потокобезопасная обертка каталога для нескольких продавцов в одном процессе:
+    читатели работают параллельно, писатели - по одному"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.lock = ReadWriteLock()
+        super().__init__(*(LockedCollection(getattr(catalog, table), self.lock)
+                           for table in ("boards", "boots", "fasteners", "helmets")))
+
+    @contextmanager
+    def reading(self):
+        """Согласованное чтение нескольких категорий: отдает сам каталог под блокировкой чтения"""
+        with self.lock.reading():
+            yield self.catalog
+
+    @contextmanager
+    def writing(self):
+        with self.lock.writing():
+            yield self.catalog
+
+    def __iter__(self):
+        with self.lock.reading():
+            yield from self.catalog
+
+    def __len__(self):
+        with self.lock.reading():
+            return len(self.catalog)
+
+    @property
+    def version(self):
+        return self.catalog.version
+
+    def save(self, item):
+        with self.lock.writing():
+            self.catalog.save(item)
+
+    def adjust(self, item, action, *args):
+        """Изменение состояния позиции (adjust_comfort и т.п.) и его сохранение одной записью"""
+        with self.lock.writing():
+            result = getattr(item, action)(*args)
+            self.catalog.save(item)
+            return result
+
+    def recommend(self, user, cache=None):
+        with self.lock.reading():
+            collections = (self.catalog.boards, self.catalog.boots, self.catalog.fasteners, self.catalog.helmets)
+            return Recommendation(**{category: _match(category, user, collection, cache)
+                                     for category, collection in zip(Recommendation.CATEGORIES, collections)})
+
+    def recommend_many(self, users):
+        with self.lock.reading():
+            return recommend_many(users, self.catalog)
+
+    def close(self):
+        with self.lock.writing():
+            close = getattr(self.catalog, "close", None)
+            if close is not None:
+                close()
+
+HAMT_BITS = 5
+HAMT_MASK = (1 << HAMT_BITS) - 1
+HASH_MASK = (1 << 64) - 1
+
+def _hamt_assoc(node, shift, entry, mutate):
+    """Вставка entry = (hash, key, value) в узел; возвращает (узел, добавлен ли новый ключ).
+    Узел - dict слот -> подузел (dict) или лист (кортеж записей с одинаковым хешем)."""
+    slot = (entry[0] >> shift) & HAMT_MASK
+    child = node.get(slot)
+    new = node if mutate else dict(node)
+    if child is None:
+        new[slot] = (entry,)
+        return new, True
+    if isinstance(child, dict):
+        new[slot], added = _hamt_assoc(child, shift + HAMT_BITS, entry, mutate)
+        return new, added
+    for index, existing in enumerate(child):
+        if existing[0] == entry[0] and existing[1] == entry[1]:
+            new[slot] = child[:index] + (entry,) + child[index + 1:]
+            return new, False
+    if child[0][0] == entry[0]:
+        new[slot] = child + (entry,)
+        return new, True
+    subnode = {}
+    for existing in child:
+        subnode, _ = _hamt_assoc(subnode, shift + HAMT_BITS, existing, True)
+    new[slot], added = _hamt_assoc(subnode, shift + HAMT_BITS, entry, True)
+    return new, added
+
+def _hamt_dissoc(node, shift, key_hash, key):
+    """Удаление ключа; если ключа нет, возвращается тот же самый узел"""
+    slot = (key_hash >> shift) & HAMT_MASK
+    child = node.get(slot)
+    if child is None:
+        return node
+    if isinstance(child, dict):
+        replacement = _hamt_dissoc(child, shift + HAMT_BITS, key_hash, key)
+        if replacement is child:
+            return node
+    else:
+        for index, existing in enumerate(child):
+            if existing[0] == key_hash and existing[1] == key:
+                replacement = child[:index] + child[index + 1:]
+                break
+        else:
+            return node
+    new = dict(node)
+    if replacement:
+        new[slot] = replacement
+    else:
+        del new[slot]
+    return new
+
+def _hamt_build(entries, shift):
+    slots = {}
+    for entry in entries:
+        slots.setdefault((entry[0] >> shift) & HAMT_MASK, []).append(entry)
+    node = {}
+    for slot, group in slots.items():
+        if len(group) == 1 or all(entry[0] == group[0][0] for entry in group):
+            node[slot] = tuple(group)
+        else:
+            node[slot] = _hamt_build(group, shift + HAMT_BITS)
+    return node
+
+class PersistentMap:
+    """Неизменяемое отображение на дереве по битам хеша (HAMT): assoc и dissoc копируют
+    только путь от корня (O(log32 n) узлов по 32 слота), остальные узлы общие со старой версией"""
+
+    __slots__ = ("root", "count")
+
+    def __init__(self, root=None, count=0):
+        self.root = {} if root is None else root
+        self.count = count
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Построение по парам с уникальными ключами: раскладка по слотам уровень за уровнем"""
+        entries = [(hash(key) & HASH_MASK, key, value) for key, value in pairs]
+        return cls(_hamt_build(entries, 0), len(entries))
+
+    def get(self, key, default=None):
+        key_hash = hash(key) & HASH_MASK
+        node = self.root
+        shift = 0
+        while True:
+            child = node.get((key_hash >> shift) & HAMT_MASK)
+            if child is None:
+                return default
+            if isinstance(child, dict):
+                node = child
+                shift += HAMT_BITS
+                continue
+            for entry_hash, existing, value in child:
+                if entry_hash == key_hash and existing == key:
+                    return value
+            return default
+
+    def assoc(self, key, value):
+        root, added = _hamt_assoc(self.root, 0, (hash(key) & HASH_MASK, key, value), False)
+        return PersistentMap(root, self.count + added)
+
+    def dissoc(self, key):
+        root = _hamt_dissoc(self.root, 0, hash(key) & HASH_MASK, key)
+        return self if root is self.root else PersistentMap(root, self.count - 1)
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def __len__(self):
+        return self.count
+
+    def values(self):
+        stack = [self.root]
+        while stack:
+            for child in stack.pop().values():
+                if isinstance(child, dict):
+                    stack.append(child)
+                else:
+                    for _, _, value in child:
+                        yield value
+
+VERSION_CHUNK = 64
+
+class ChunkedRun:
+    """Неизменяемая последовательность позиций, упорядоченная по уникальному ключу и разбитая
+    на блоки до 2 * VERSION_CHUNK. Вставка и удаление копируют один блок и кортеж ссылок
+    на блоки, сами блоки общие со старой версией."""
+
+    __slots__ = ("chunks", "firsts", "offsets", "length")
+
+    def __init__(self, chunks=()):
+        self.chunks = chunks
+        self.firsts = tuple(keys[0] for keys, _ in chunks)
+        offsets = []
+        length = 0
+        for keys, _ in chunks:
+            offsets.append(length)
+            length += len(keys)
+        self.offsets = tuple(offsets)
+        self.length = length
+
+    @classmethod
+    def build(cls, pairs):
+        pairs = sorted(pairs, key=lambda pair: pair[0])
+        return cls(tuple((tuple(key for key, _ in pairs[start:start + VERSION_CHUNK]),
+                          tuple(item for _, item in pairs[start:start + VERSION_CHUNK]))
+                         for start in range(0, len(pairs), VERSION_CHUNK)))
+
+    def insert(self, key, item):
+        if not self.chunks:
+            return ChunkedRun((((key,), (item,)),))
+        index = max(bisect_right(self.firsts, key) - 1, 0)
+        keys, items = self.chunks[index]
+        position = bisect_right(keys, key)
+        keys = keys[:position] + (key,) + keys[position:]
+        items = items[:position] + (item,) + items[position:]
+        if len(keys) > 2 * VERSION_CHUNK:
+            replacement = ((keys[:VERSION_CHUNK], items[:VERSION_CHUNK]),
+                           (keys[VERSION_CHUNK:], items[VERSION_CHUNK:]))
+        else:
+            replacement = ((keys, items),)
+        return ChunkedRun(self.chunks[:index] + replacement + self.chunks[index + 1:])
+
+    def remove(self, key):
+        index = bisect_right(self.firsts, key) - 1
+        keys, items = self.chunks[index]
+        position = bisect_left(keys, key)
+        keys = keys[:position] + keys[position + 1:]
+        items = items[:position] + items[position + 1:]
+        replacement = ((keys, items),) if keys else ()
+        return ChunkedRun(self.chunks[:index] + replacement + self.chunks[index + 1:])
+
+    def _locate(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("run index out of range")
+        chunk = bisect_right(self.offsets, index) - 1
+        return self.chunks[chunk], index - self.offsets[chunk]
+
+    def key_at(self, index):
+        (keys, _), position = self._locate(index)
+        return keys[position]
+
+    def rank(self, key, side=bisect_left):
+        """Число ключей меньше key (bisect_left) или не больше key (bisect_right)"""
+        index = (bisect_left if side is bisect_left else bisect_right)(self.firsts, key) - 1
+        if index < 0:
+            return 0
+        return self.offsets[index] + side(self.chunks[index][0], key)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self.length))]
+        (_, items), position = self._locate(index)
+        return items[position]
+
+    def __iter__(self):
+        for _, items in self.chunks:
+            yield from items
+
+EMPTY_RUN = ChunkedRun()
+
+class RunRange:
+    """Ленивый срез ChunkedRun [start, stop) без копирования"""
+
+    def __init__(self, run, start, stop):
+        self.run = run
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        return self.run[self.start + index]
+
+    def __iter__(self):
+        for index in range(self.start, self.stop):
+            yield self.run[index]
+
+class _RunHeights:
+    """Первые компоненты ключей (рост доски) как последовательность для nearest_positions"""
+
+    def __init__(self, run):
+        self.run = run
+
+    def __len__(self):
+        return len(self.run)
+
+    def __getitem__(self, index):
+        return self.run.key_at(index)[0]
+
+class VersionedCategory:
+    """Категория одной версии каталога: неизменяема и делит блоки и узлы с соседними версиями.
+    Для досок (attribute="height") позиции в группе упорядочены по росту."""
+
+    def __init__(self, key, attribute, buckets, members, version, sequence):
+        self.key = key
+        self.key_fields = getattr(key, "fields", None)
+        self.attribute = attribute
+        self.buckets = buckets
+        self.members = members
+        self.version = version
+        self.sequence = sequence
+
+    def sort_key(self, item, sequence):
+        return (getattr(item, self.attribute), sequence) if self.attribute else sequence
+
+    @classmethod
+    def build(cls, key, attribute, items, version):
+        category = cls(key, attribute, {}, PersistentMap(), version, 0)
+        unique = {}
+        for item in items:
+            unique.setdefault(item, item)
+        groups = {}
+        members = []
+        for sequence, item in enumerate(unique.values()):
+            bucket_key = key(item)
+            sort_key = category.sort_key(item, sequence)
+            groups.setdefault(bucket_key, []).append((sort_key, item))
+            members.append((item, (bucket_key, sort_key, item)))
+        buckets = {bucket_key: ChunkedRun.build(pairs) for bucket_key, pairs in groups.items()}
+        return cls(key, attribute, buckets, PersistentMap.from_pairs(members), version, len(unique))
+
+    def with_changes(self, changes, version):
+        """Новая версия категории после событий (event, item): O(изменений), а не O(категории)"""
+        buckets = dict(self.buckets)
+        members = self.members
+        sequence = self.sequence
+        for event, item in changes:
+            if event == "clear":
+                buckets = {}
+                members = PersistentMap()
+            elif event == "add":
+                if item in members:
+                    continue
+                bucket_key = self.key(item)
+                sort_key = self.sort_key(item, sequence)
+                sequence += 1
+                buckets[bucket_key] = buckets.get(bucket_key, EMPTY_RUN).insert(sort_key, item)
+                members = members.assoc(item, (bucket_key, sort_key, item))
+            elif event == "discard":
+                entry = members.get(item)
+                if entry is None:
+                    continue
+                bucket_key, sort_key, _ = entry
+                run = buckets[bucket_key].remove(sort_key)
+                if run:
+                    buckets[bucket_key] = run
+                else:
+                    del buckets[bucket_key]
+                members = members.dissoc(item)
+        return type(self)(self.key, self.attribute, buckets, members, version, sequence)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, item):
+        return item in self.members
+
+    def __iter__(self):
+        for run in self.buckets.values():
+            yield from run
+
+    def lookup(self, *key):
+        return self.buckets.get(key, EMPTY_RUN)
+
+    def bucket_keys(self):
+        return self.buckets.keys()
+
+    def add(self, item):
+        raise InvalidInputError("Catalog versions are read-only; publish changes through VersionedCatalog.")
+
+    discard = add
+
+class SortedVersionedCategory(VersionedCategory):
+    """Категория досок: ключ позиции в группе - (рост, порядковый номер)"""
+
+    def window(self, bucket_key, low, high):
+        run = self.buckets.get(bucket_key, EMPTY_RUN)
+        return RunRange(run, run.rank((low,)), run.rank((high, math.inf), bisect_right))
+
+    def nearest(self, bucket_key, center, tolerance):
+        run = self.buckets.get(bucket_key, EMPTY_RUN)
+        return (run[position] for position in nearest_positions(_RunHeights(run), center, tolerance))
+
+# Таблица, ключ индекса, атрибут сортировки внутри группы
+VERSIONED_LAYOUT = (
+    ("boards", board_key, "height"),
+    ("boots", boots_key, None),
+    ("fasteners", fasteners_key, None),
+    ("helmets", helmet_key, None),
+)
+
+class CatalogVersion(EquipmentCatalog):
+    """Неизменяемая версия каталога; version - номер публикации"""
+
+    def __init__(self, number, boards, boots, fasteners, helmets):
+        self.number = number
+        super().__init__(boards, boots, fasteners, helmets)
+
+    @property
+    def version(self):
+        return self.number
+
+    def add(self, item):
+        raise InvalidInputError("Catalog versions are read-only; publish changes through VersionedCatalog.")
+
+@contextmanager
+def gc_paused():
+    """Отключает циклический сборщик мусора на время массового построения ациклических
+    структур: иначе он многократно обходит миллионы только что созданных кортежей"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+class VersionedCatalog:
+    """Версионированные неизменяемые снимки каталога.
+
+    Читатель фиксирует версию (pin) на время подбора или отчета и видит ее целиком:
+    без блокировок и без наполовину примененных добавлений. Писатели публикуют новую
+    версию за O(измененных позиций); неизмененные категории переходят в новую версию
+    тем же объектом, поэтому RecommendationCache по ним не сбрасывается.
+    """
+
+    def __init__(self, source=None):
+        self.lock = threading.Lock()
+        self.current = self._build(None, 0)
+        if source is not None:
+            self.follow(source)
+
+    @staticmethod
+    def _build(source, number):
+        categories = {}
+        with gc_paused():
+            for table, key, attribute in VERSIONED_LAYOUT:
+                category_class = SortedVersionedCategory if attribute else VersionedCategory
+                items = getattr(source, table) if source is not None else ()
+                categories[table] = category_class.build(key, attribute, items, number)
+        return CatalogVersion(number, **categories)
+
+    def follow(self, source):
+        """Публикует новую версию на каждое изменение коллекций source. Для ConcurrentCatalog
+        начальная версия и подписка делаются под одной блокировкой записи."""
+        writing = getattr(source, "writing", None)
+        with (writing() if writing is not None else nullcontext(source)) as catalog:
+            with self.lock:
+                self.current = self._build(catalog, self.current.number + 1)
+            for table, *_ in VERSIONED_LAYOUT:
+                getattr(catalog, table).subscribe(
+                    lambda event, item, table=table: self.publish([(table, event, item)]))
+
+    def pin(self):
+        """Текущая версия; она не меняется, сколько бы ее ни читали"""
+        return self.current
+
+    @property
+    def version(self):
+        return self.current.number
+
+    def publish(self, changes):
+        """Применяет события (table, event, item) одной новой версией и возвращает ее"""
+        with self.lock:
+            grouped = {}
+            for table, event, item in changes:
+                grouped.setdefault(table, []).append((event, item))
+            current = self.current
+            number = current.number + 1
+            categories = {table: getattr(current, table) for table, *_ in VERSIONED_LAYOUT}
+            for table, table_changes in grouped.items():
+                categories[table] = categories[table].with_changes(table_changes, number)
+            self.current = CatalogVersion(number, **categories)
+            return self.current
+
+    @staticmethod
+    def table_for(item):
+        for table, cls, *_ in SNAPSHOT_LAYOUT:
+            if isinstance(item, cls):
+                return table
+        raise InvalidInputError(f"Unsupported equipment type: {item.__class__.__name__}")
+
+    def add(self, item):
+        return self.publish([(self.table_for(item), "add", item)])
+
+    def add_many(self, items):
+        return self.publish([(self.table_for(item), "add", item) for item in items])
+
+    def discard(self, item):
+        return self.publish([(self.table_for(item), "discard", item)])
+
+def text(value):
+    """Строковое поле записи: в отличие от str() не превращает в текст объекты, списки и null"""
+    if not isinstance(value, str):
+        raise TypeError(f"expected a string, not '{type(value).__name__}'")
+    return value
+
+# Тип строки файла -> класс и поля конструктора с тем же приведением типов, что и в from_input
+IMPORT_FIELDS = {
+    "board": (Board, (("name", text), ("gender", text), ("skill", text), ("height", float))),
+    "boots": (Boots, (("name", text), ("gender", text), ("skill", text), ("leg_size", float))),
+    "fasteners": (Fasteners, (("name", text), ("gender", text), ("skill", text), ("fasteners_size", text))),
+    "helmet": (Helmet, (("name", text), ("gender", text), ("helmet_size", text))),
+}
+IMPORT_CHUNK_SIZE = 10000
+EQUIPMENT_ATTRIBUTES = {cls: attribute for _, cls, attribute, *_ in SNAPSHOT_LAYOUT}
+
+def parse_import_record(record):
+    """Аргументы конструктора из строки файла; ошибки как в from_input -> InvalidInputError"""
+    kind = str(record.get("type") or "").strip().lower()
+    if kind not in IMPORT_FIELDS:
+        raise InvalidInputError(f"Unknown equipment type: {record.get('type')!r}")
+    cls, fields = IMPORT_FIELDS[kind]
+    try:
+        args = []
+        for field, convert in fields:
+            value = record.get(field)
+            if value is None:
+                raise ValueError(f"missing field '{field}'")
+            args.append(convert(value))
+    except (TypeError, ValueError) as e:
+        raise InvalidInputError(f"Invalid input: {e}")
+    return cls, tuple(args)
+
+def import_probe(cls, args):
+    """Объект для проверки дубликата по (name, gender) без счетчика total_equipment и лога"""
+    name, gender, *rest = args
+    skill = rest[0] if len(rest) == 2 else "all"
+    return restore_equipment(cls, name, gender, skill, EQUIPMENT_ATTRIBUTES[cls], rest[-1], None)
+
+def read_import_records(path):
+    """Потоковое чтение CSV или JSONL: пары (номер строки, запись или InvalidInputError)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in (".csv", ".jsonl", ".ndjson"):
+        raise InvalidInputError(f"Unsupported import format: {path} (expected .csv or .jsonl)")
+    with open(path, newline="", encoding="utf-8") as file:
+        if extension == ".csv":
+            reader = csv.DictReader(file)
+            for record in reader:
+                yield reader.line_num, record
+            return
+        for line, text in enumerate(file, 1):
+            if not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                yield line, InvalidInputError(f"Invalid JSON: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield line, InvalidInputError("Invalid input: expected a JSON object")
+                continue
+            yield line, record
+
+class ImportReport:
+    """Итоги импорта: прочитано, добавлено, дубликаты, отклоненные строки с причинами"""
+
+    def __init__(self, path, max_errors=100):
+        self.path = path
+        self.rows = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.rejected = 0
+        self.errors = []
+        self.max_errors = max_errors
+        self.elapsed = 0.0
+
+    def reject(self, line, error):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(InvalidInputError(f"line {line}: {error}"))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.rows} rows: {self.imported} imported, {self.duplicates} duplicates, "
+                f"{self.rejected} rejected in {self.elapsed:.2f} s ({self.rows_per_second:,.0f} rows/s)")
+
+    def __repr__(self):
+        return f"ImportReport({self.path!r}, {self.summary()})"
+
+def _import_chunk(chunk, catalog, report):
+    groups = {}
+    for line, record in chunk:
+        report.rows += 1
+        try:
+            if isinstance(record, InvalidInputError):
+                raise record
+            cls, args = parse_import_record(record)
+        except InvalidInputError as e:
+            report.reject(line, e)
+            continue
+        groups.setdefault(cls, []).append(args)
+    for cls, rows in groups.items():
+        collection = catalog.collection_for(import_probe(cls, rows[0]))
+        # Идентичность позиции - Equipment.__hash__/__eq__ (name, gender): и внутри пачки, и в каталоге.
+        # Дубликаты отсеиваются до создания объектов, чтобы не увеличивать total_equipment
+        seen = set()
+        fresh_rows = []
+        for row in rows:
+            probe = import_probe(cls, row)
+            if probe in seen or probe in collection:
+                report.duplicates += 1
+                continue
+            seen.add(probe)
+            fresh_rows.append(row)
+        if not fresh_rows:
+            continue
+        fresh = cls.bulk_create(fresh_rows)
+        add_many = getattr(collection, "add_many", None)
+        if add_many is not None:
+            add_many(fresh)
+        else:
+            for item in fresh:
+                collection.add(item)
+        report.imported += len(fresh)
+
+def import_equipment(path, catalog, chunk_size=IMPORT_CHUNK_SIZE, max_errors=100):
+    """Импорт поставщицкого файла в каталог пачками по chunk_size строк: память не растет
+    с размером файла, плохие строки попадают в отчет, а не прерывают импорт"""
+    report = ImportReport(path, max_errors)
+    start = time.perf_counter()
+    records = read_import_records(path)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        _import_chunk(chunk, catalog, report)
+    report.elapsed = time.perf_counter() - start
+    log_action(f"Imported {path}: {report.summary()}")
+    return report
+
+class QueryPlan:
+    """План выполнения EquipmentQuery: способ доступа, остаточные фильтры, сортировка"""
+
+    def __init__(self, access, index_key=None, enforced=(), residual=(), residual_fields=(),
+                 sort=None, limit=None):
+        self.access = access
+        self.index_key = index_key
+        self.enforced = tuple(enforced)
+        self.residual = tuple(residual)
+        self.residual_fields = tuple(residual_fields)
+        self.sort = sort
+        self.limit = limit
+
+    def explain(self):
+        lines = [f"access: {self.access}" + (f" on {self.index_key}" if self.index_key else "")]
+        if self.enforced:
+            lines.append(f"index predicates: {', '.join(self.enforced)}")
+        if self.residual:
+            lines.append(f"filter: {', '.join(self.residual)}")
+        if self.sort:
+            lines.append(f"order: {self.sort}")
+        if self.limit is not None:
+            lines.append(f"limit: {self.limit}")
+        return "\n".join(lines)
+
+class EquipmentQuery:
+    """Декларативный запрос к коллекции снаряжения: фильтры по равенству и диапазонам,
+    сортировка и лимит. Планировщик использует хеш- и сортированные индексы коллекции,
+    а полный перебор выбирает только когда индекс не помогает."""
+
+    def __init__(self, source):
+        self.source = source
+        self.equals = {}
+        self.ranges = {}
+        self.order_field = None
+        self.descending = False
+        self.limit_count = None
+
+    def where(self, **equals):
+        self.equals.update(equals)
+        return self
+
+    def between(self, field, low=float("-inf"), high=float("inf")):
+        self.ranges[field] = (low, high)
+        return self
+
+    def order_by(self, field, descending=False):
+        self.order_field = field
+        self.descending = descending
+        return self
+
+    def limit(self, count):
+        self.limit_count = count
+        return self
+
+    def _describe(self, field):
+        if field in self.equals:
+            return f"{field} == {self.equals[field]!r}"
+        low, high = self.ranges[field]
+        return f"{low!r} <= {field} <= {high!r}"
+
+    def plan(self):
+        source = self.source
+        key_fields = getattr(source, "key_fields", None) if is_indexed(source) else None
+        sort_attribute = source.attribute if is_sorted_index(source) else None
+        predicates = list(self.equals) + [field for field in self.ranges if field not in self.equals]
+        enforced = []
+        presorted = False
+        if key_fields is None:
+            access = "full scan"
+        else:
+            name = f"{type(source).__name__}({', '.join(key_fields)})"
+            exact = all(field in self.equals for field in key_fields)
+            enforced = [field for field in key_fields if field in self.equals or field in self.ranges]
+            if sort_attribute is not None and sort_attribute in self.ranges and sort_attribute not in self.equals:
+                enforced.append(sort_attribute)
+            if exact and sort_attribute is not None:
+                access = "index range scan" if sort_attribute in enforced else "index bucket scan"
+                presorted = True
+            elif exact:
+                access = "hash lookup"
+            elif enforced:
+                access = "index key scan"
+            else:
+                access = "full scan"
+                enforced = []
+        residual = [field for field in predicates if field not in enforced]
+        sort = None
+        if self.order_field is not None:
+            direction = " desc" if self.descending else ""
+            if presorted and self.order_field == sort_attribute:
+                sort = f"{self.order_field}{direction} (index order)"
+            elif self.limit_count is not None:
+                sort = f"{self.order_field}{direction} (top-{self.limit_count} heap)"
+            else:
+                sort = f"{self.order_field}{direction} (sort)"
+        return QueryPlan(access, name if key_fields is not None and access != "full scan" else None,
+                         [self._describe(field) for field in enforced],
+                         [self._describe(field) for field in residual], residual, sort, self.limit_count)
+
+    def explain(self):
+        return self.plan().explain()
+
+    def _index_candidates(self, access):
+        source = self.source
+        key_fields = source.key_fields
+        sort_attribute = source.attribute if is_sorted_index(source) else None
+        low, high = self.ranges.get(sort_attribute, (float("-inf"), float("inf")))
+        if access == "hash lookup":
+            return source.lookup(*(self.equals[field] for field in key_fields))
+        if access in ("index range scan", "index bucket scan"):
+            return source.window(tuple(self.equals[field] for field in key_fields), low, high)
+        return self._key_scan(source, key_fields, sort_attribute, low, high)
+
+    def _key_scan(self, source, key_fields, sort_attribute, low, high):
+        for key in list(source.bucket_keys()):
+            if all(self._accepts(field, value) for field, value in zip(key_fields, key)
+                   if field in self.equals or field in self.ranges):
+                if sort_attribute is not None:
+                    yield from source.window(key, low, high)
+                else:
+                    yield from source.lookup(*key)
+
+    def _accepts(self, field, value):
+        if field in self.equals and value != self.equals[field]:
+            return False
+        if field in self.ranges:
+            low, high = self.ranges[field]
+            if not low <= value <= high:
+                return False
+        return True
+
+    def _matches(self, item, fields):
+        for field in fields:
+            value = getattr(item, field, MISSING)
+            if value is MISSING or not self._accepts(field, value):
+                return False
+        return True
+
+    def run(self):
+        plan = self.plan()
+        if plan.access == "full scan":
+            candidates = self.source
+        else:
+            candidates = self._index_candidates(plan.access)
+        residual = plan.residual_fields
+        results = (item for item in candidates if self._matches(item, residual)) if residual else iter(candidates)
+        if plan.sort is None or plan.sort.endswith("(index order)"):
+            if plan.sort is not None and self.descending:
+                results = reversed(list(results))
+            if self.limit_count is not None:
+                results = islice(results, self.limit_count)
+            return list(results)
+        key = lambda item: getattr(item, self.order_field)
+        if self.limit_count is not None:
+            if self.descending:
+                return heapq.nlargest(self.limit_count, results, key=key)
+            return heapq.nsmallest(self.limit_count, results, key=key)
+        return sorted(results, key=key, reverse=self.descending)
+
+    def __iter__(self):
+        return iter(self.run())
+
+def _match_boards(users, groups, boards):
+    matches = {}
+    if is_sorted_index(boards):
+        for key, positions in groups.items():
+            for position in positions:
+                board = next(iter(boards.nearest(key, users[position].height, 10)), None)
+                if board is not None:
+                    matches[position] = board
+        return matches
+
+    by_group = {key: [] for key in groups}
+    for order, board in enumerate(boards):
+        bucket = by_group.get((board.gender, board.skill))
+        if bucket is not None:
+            bucket.append((board.height, order, board))
+    for key, positions in groups.items():
+        bucket = sorted(by_group[key], key=lambda entry: entry[0])
+        heights = [entry[0] for entry in bucket]
+        for position in positions:
+            height = users[position].height
+            start = bisect_left(heights, height - 10)
+            stop = bisect_right(heights, height + 10, start)
+            if start < stop:
+                matches[position] = min(bucket[start:stop], key=lambda entry: entry[1])[2]
+    return matches
+
+def _match_exact(users, groups, items, group_of, size_of, user_size_of):
+    matches = {}
+    if is_indexed(items):
+        for key, positions in groups.items():
+            for position in positions:
+                candidates = items.lookup(*key, user_size_of(users[position]))
+                if candidates:
+                    matches[position] = candidates[0]
+        return matches
+
+    by_group = {key: {} for key in groups}
+    for item in items:
+        bucket = by_group.get(group_of(item))
+        if bucket is not None:
+            bucket.setdefault(size_of(item), item)
+    for key, positions in groups.items():
+        bucket = by_group[key]
+        for position in positions:
+            item = bucket.get(user_size_of(users[position]))
+            if item is not None:
+                matches[position] = item
+    return matches
+
+def recommend_many(users, catalog):
+    """Подбор снаряжения всех четырех категорий для группы пользователей.
+
+    Возвращает список Recommendation в порядке списка users.
+    """
+    users = list(users)
+    groups = {}
+    genders = {}
+    for position, user in enumerate(users):
+        groups.setdefault((user.gender, user.skill), []).append(position)
+        genders.setdefault((user.gender,), []).append(position)
+
+    boards = _match_boards(users, groups, catalog.boards)
+    boots = _match_exact(users, groups, catalog.boots,
+                         lambda boot: (boot.gender, boot.skill),
+                         lambda boot: boot.leg_size,
+                         lambda user: user.leg_size)
+    fasteners = _match_exact(users, groups, catalog.fasteners,
+                             lambda fastener: (fastener.gender, fastener.skill),
+                             lambda fastener: fastener.fasteners,
+                             lambda user: user.fasteners)
+    helmets = _match_exact(users, genders, catalog.helmets,
+                           lambda helmet: (helmet.gender,),
+                           lambda helmet: helmet.size,
+                           lambda user: user.helmet_size)
+
+    log_action(f"Recommended equipment for {len(users)} users")
+    return [Recommendation(board=boards.get(position),
+                           boots=boots.get(position),
+                           fasteners=fasteners.get(position),
+                           helmet=helmets.get(position))
+            for position in range(len(users))]
+
+SKILL_LEVELS = {"beginner": 0, "intermediate": 1, "advanced": 2}
+SIZE_LEVELS = {"S": 0, "M": 1, "L": 2, "XL": 3}
+SCORE_WEIGHTS = {"distance": 1.0, "skill": 5.0, "price": 0.05}
+
+def level_gap(levels, wanted, actual):
+    if wanted == actual:
+        return 0
+    if wanted in levels and actual in levels:
+        return abs(levels[wanted] - levels[actual])
+    return None
+
+def fit_distance(user, item):
+    """Расстояние по размеру: доски в десятках сантиметров, ботинки в сантиметрах, остальное в шагах размерной сетки"""
+    kind = equipment_class(item)
+    if issubclass(kind, Board):
+        return abs(item.height - user.height) / 10
+    if issubclass(kind, Boots):
+        return abs(item.leg_size - user.leg_size)
+    if issubclass(kind, Fasteners):
+        return level_gap(SIZE_LEVELS, user.fasteners, item.fasteners)
+    if issubclass(kind, Helmet):
+        return level_gap(SIZE_LEVELS, user.helmet_size, item.size)
+    return None
+
+def score_equipment(user, item):
+    """Оценка соответствия снаряжения пользователю: меньше - лучше, None - не подходит"""
+    if item.gender != user.gender:
+        return None
+    distance = fit_distance(user, item)
+    skill = 0 if item.skill == "all" else level_gap(SKILL_LEVELS, user.skill, item.skill)
+    if distance is None or skill is None:
+        return None
+    return (SCORE_WEIGHTS["distance"] * distance +
+            SCORE_WEIGHTS["skill"] * skill +
+            SCORE_WEIGHTS["price"] * item.calculate_rental_price(1))
+
+def _board_candidates(user, boards, max_distance):
+    low = user.height - 10 * max_distance
+    high = user.height + 10 * max_distance
+    if is_sorted_index(boards):
+        for key in boards.bucket_keys():
+            if key[0] == user.gender:
+                yield from boards.window(key, low, high)
+    else:
+        for board in boards:
+            if board.gender == user.gender and low <= board.height <= high:
+                yield board
+
+def _indexed_candidates(user, items, key_matches):
+    if is_indexed(items):
+        for key in items.bucket_keys():
+            if key[0] == user.gender and key_matches(key):
+                yield from items.lookup(*key)
+    else:
+        for item in items:
+            if item.gender == user.gender and key_matches(_exact_key(item)):
+                yield item
+
+def _exact_key(item):
+    if isinstance(item, Boots):
+        return boots_key(item)
+    if isinstance(item, Fasteners):
+        return fasteners_key(item)
+    return helmet_key(item)
+
+def _size_within(wanted, actual, max_distance):
+    gap = level_gap(SIZE_LEVELS, wanted, actual)
+    return gap is not None and gap <= max_distance
+
+def top_k_candidates(user, category, catalog, max_distance=1):
+    if category == "board":
+        return _board_candidates(user, catalog.boards, max_distance)
+    if category == "boots":
+        return _indexed_candidates(user, catalog.boots,
+                                   lambda key: abs(key[2] - user.leg_size) <= max_distance)
+    if category == "fasteners":
+        return _indexed_candidates(user, catalog.fasteners,
+                                   lambda key: _size_within(user.fasteners, key[2], max_distance))
+    if category == "helmet":
+        return _indexed_candidates(user, catalog.helmets,
+                                   lambda key: _size_within(user.helmet_size, key[1], max_distance))
+    raise InvalidInputError(f"Unknown equipment category: {category}")
+
+def recommend_top_k(user, category, k, catalog, max_distance=1):
+    """k лучших позиций категории по score_equipment за один проход по кандидатам индекса.
+
+    Возвращает список пар (оценка, снаряжение), лучшие первыми. Равные оценки упорядочены
+    по (name, gender), а не по порядку обхода: порядок групп у индекса в памяти, SQLite и
+    mmap-снимка разный, а результат от хранилища зависеть не должен.
+    """
+    if k <= 0:
+        return []
+    scores = ((score_equipment(user, item), item)
+              for item in top_k_candidates(user, category, catalog, max_distance))
+    return heapq.nsmallest(k, ((score, item) for score, item in scores if score is not None),
+                           key=lambda entry: (entry[0], entry[1].name, entry[1].gender))
+
+CATEGORY_TABLES = {"board": "boards", "boots": "boots", "fasteners": "fasteners", "helmet": "helmets"}
+PARALLEL_SNAPSHOT = "equipment_catalog.workers.snap"
+
+def read_view(catalog):
+    """Контекст согласованного чтения каталога: для ConcurrentCatalog - под блокировкой чтения"""
+    reading = getattr(catalog, "reading", None)
+    return reading() if reading is not None else nullcontext(catalog)
+
+def recommend_category(user, category, catalog, scored=False):
+    """Подбор одной категории: первое подходящее (как recommend_*) или лучшее по score_equipment"""
+    with read_view(catalog) as view:
+        if not scored:
+            return MATCHERS[category](user, getattr(view, CATEGORY_TABLES[category]))
+        best = recommend_top_k(user, category, 1, view)
+        return best[0][1] if best else None
+
+worker_catalog = None
+worker_generation = None
+
+def _init_recommend_worker():
+    global log_writer
+    # Поток асинхронного лога остался в родителе; LOG-строки рабочих не должны попадать в меню
+    log_writer = None
+    sys.stdout = open(os.devnull, "w")
+
+def _recommend_in_worker(path, generation, category, user, scored):
+    global worker_catalog, worker_generation
+    if worker_generation != generation:
+        if worker_catalog is not None:
+            worker_catalog.close()
+        worker_catalog = MappedCatalog(path)
+        worker_generation = generation
+    item = recommend_category(user, category, worker_catalog, scored)
+    return item.materialize() if isinstance(item, EquipmentRow) else item
+
+class ParallelRecommender:
+    """Подбор четырех категорий параллельно в пуле потоков или процессов.
+
+    У каждой категории свой таймаут (число или словарь по категориям); не успевшие
+    категории отмечаются в Recommendation.timed_out, остальные возвращаются как есть.
+    Рабочие процессы читают mmap-снимок каталога, который переписывается при смене
+    версии каталога, поэтому CPU-затратная оценка (scored=True) не упирается в GIL.
+    """
+
+    def __init__(self, catalog, executor="thread", timeout=1.0, scored=False, snapshot_path=PARALLEL_SNAPSHOT):
+        if executor not in ("thread", "process"):
+            raise InvalidInputError(f"Unknown executor: {executor} (expected thread or process)")
+        self.catalog = catalog
+        self.executor = executor
+        self.timeouts = timeout if isinstance(timeout, dict) else dict.fromkeys(Recommendation.CATEGORIES, timeout)
+        self.scored = scored
+        self.snapshot_path = snapshot_path
+        self.snapshot_version = None
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.timeouts_hit = Counter()
+        workers = len(Recommendation.CATEGORIES)
+        if executor == "thread":
+            self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recommend")
+        else:
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_recommend_worker)
+
+    def _refresh_snapshot(self):
+        with self.lock, read_view(self.catalog) as view:
+            version = view.version
+            if version == self.snapshot_version:
+                return
+            write_snapshot(view, self.snapshot_path)
+            self.snapshot_version = version
+            self.generation += 1
+
+    def _submit(self, category, user):
+        if self.executor == "thread":
+            return self.pool.submit(recommend_category, user, category, self.catalog, self.scored)
+        return self.pool.submit(_recommend_in_worker, self.snapshot_path, self.generation,
+                                category, user, self.scored)
+
+    def recommend(self, user):
+        if self.executor == "process":
+            self._refresh_snapshot()
+        start = time.perf_counter()
+        futures = {category: self._submit(category, user) for category in Recommendation.CATEGORIES}
+        found = {}
+        timed_out = []
+        for category, future in futures.items():
+            remaining = start + self.timeouts[category] - time.perf_counter()
+            try:
+                found[category] = future.result(timeout=max(remaining, 0))
+            except FutureTimeoutError:
+                future.cancel()
+                timed_out.append(category)
+                self.timeouts_hit[category] += 1
+                log_action(f"Recommendation of {category} for user {user.name} timed out")
+        return Recommendation(timed_out=timed_out, **found)
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        if self.snapshot_version is not None and os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
+
+worker_shards = {}
+worker_shards_generation = None
+
+def _attach_shard(name, generation):
+    """Подключение рабочего процесса к сегменту шарда по имени; сегменты прошлых поколений закрываются"""
+    global worker_shards_generation
+    if worker_shards_generation != generation:
+        for segment, catalog in worker_shards.values():
+            catalog.close()
+            segment.close()
+        worker_shards.clear()
+        worker_shards_generation = generation
+    if name not in worker_shards:
+        segment = shared_memory.SharedMemory(name=name)
+        worker_shards[name] = (segment, MappedCatalog.from_buffer(segment.buf, name))
+    return worker_shards[name][1]
+
+def _recommend_in_shard(name, generation, users):
+    catalog = _attach_shard(name, generation)
+    return [tuple(None if item is None else item.row
+                  for item in map(recommendation.get, Recommendation.CATEGORIES))
+            for recommendation in recommend_many(users, catalog)]
+
+def _aggregate_in_shard(name, generation, tables, reductions):
+    catalog = _attach_shard(name, generation)
+    partials = {}
+    for table in tables:
+        category = getattr(catalog, table)
+        for attribute in reductions:
+            aggregate = AttributeAggregate()
+            if attribute == category.attribute and not category.categorical:
+                aggregate.add_column(category, category.values)
+                if aggregate.count:
+                    aggregate.argmax, aggregate.argmin = aggregate.argmax.row, aggregate.argmin.row
+            else:
+                try:
+                    for row in range(category.count):
+                        aggregate.add(row, category.value(row, attribute))
+                except AttributeError:
+                    continue
+            if aggregate.count:
+                partials[table, attribute] = (aggregate.count, aggregate.total, aggregate.maximum,
+                                              aggregate.argmax, aggregate.minimum, aggregate.argmin,
+                                              aggregate.numeric)
+    return partials
+
+def shard_keys(user):
+    # Доски, ботинки и крепления лежат в шарде (gender, skill) пользователя, шлемы - в (gender, "all")
+    return {(user.gender, user.skill), (user.gender, "all")}
+
+class SharedCatalog:
+    """Снимок каталога в сегментах multiprocessing.shared_memory, разбитый на шарды по (gender, skill).
+
+    Каждый шард - снимок в формате write_snapshot; рабочие процессы подключаются к сегментам
+    по имени и читают колонки без копирования и без pickle коллекций. Подбор и агрегации
+    выполняются scatter-gather: по задаче на шард, частичные результаты сливаются в родителе.
+    """
+
+    def __init__(self, catalog, workers=None):
+        self.catalog = catalog
+        self.workers = workers or os.cpu_count()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_recommend_worker)
+        self.lock = ReadWriteLock()
+        self.segments = {}
+        self.views = {}
+        self.snapshot_version = None
+        self.generation = 0
+        self.refresh()
+
+    def refresh(self):
+        """Перестроение шардов, если версия исходного каталога изменилась"""
+        with self.lock.writing(), read_view(self.catalog) as view:
+            version = view.version
+            if version == self.snapshot_version:
+                return
+            shards = {}
+            for table, *_ in SNAPSHOT_LAYOUT:
+                for item in getattr(view, table):
+                    tables = shards.get((item.gender, item.skill))
+                    if tables is None:
+                        tables = shards[item.gender, item.skill] = {name: [] for name, *_ in SNAPSHOT_LAYOUT}
+                    tables[table].append(item)
+            self._release()
+            for key, tables in shards.items():
+                parts = snapshot_parts(EquipmentCatalog(**tables))
+                segment = shared_memory.SharedMemory(create=True, size=sum(map(len, parts)))
+                offset = 0
+                for part in parts:
+                    segment.buf[offset:offset + len(part)] = part
+                    offset += len(part)
+                self.segments[key] = segment
+                self.views[key] = MappedCatalog.from_buffer(segment.buf, segment.name)
+            self.snapshot_version = version
+            self.generation += 1
+        log_action(f"Shared catalog rebuilt: {len(self.segments)} shards, {self.nbytes()} bytes")
+
+    def _release(self):
+        for key, segment in self.segments.items():
+            self.views[key].close()
+            segment.close()
+            segment.unlink()
+        self.segments.clear()
+        self.views.clear()
+
+    def nbytes(self):
+        return sum(segment.size for segment in self.segments.values())
+
+    def __len__(self):
+        return sum(len(view) for view in self.views.values())
+
+    def _scatter(self, function, tasks):
+        """Задачи по шардам в пул; возвращает {шард: результат}"""
+        futures = {key: self.pool.submit(function, self.segments[key].name, self.generation, *arguments)
+                   for key, arguments in tasks.items()}
+        return {key: future.result() for key, future in futures.items()}
+
+    def recommend_many(self, users):
+        """Подбор для группы пользователей: каждому шарду отправляются только его пользователи"""
+        self.refresh()
+        users = list(users)
+        with self.lock.reading():
+            positions = {}
+            for position, user in enumerate(users):
+                for key in shard_keys(user):
+                    if key in self.segments:
+                        positions.setdefault(key, []).append(position)
+            results = self._scatter(_recommend_in_shard, {
+                key: ([users[position] for position in shard_positions],)
+                for key, shard_positions in positions.items()})
+            found = [{} for _ in users]
+            for key, rows in results.items():
+                view = self.views[key]
+                for position, user_rows in zip(positions[key], rows):
+                    for category, row in zip(Recommendation.CATEGORIES, user_rows):
+                        if row is not None:
+                            found[position][category] = getattr(view, CATEGORY_TABLES[category]).materialize(row)
+        log_action(f"Recommended equipment for {len(users)} users over {len(results)} shards")
+        return [Recommendation(**matches) for matches in found]
+
+    def recommend(self, user):
+        return self.recommend_many([user])[0]
+
+    def aggregate(self, reductions, tables=None):
+        """Редукции как у EquipmentManager.aggregate, посчитанные по шардам и слитые в родителе.
+
+        tables: таблицы каталога (по умолчанию все); argmax/argmin возвращаются объектами Equipment.
+        """
+        for attribute, operations in reductions.items():
+            for operation in operations:
+                if operation not in AttributeAggregate.OPERATIONS:
+                    raise ValueError(f"Unknown reduction: {operation}")
+        tables = tuple(tables or (table for table, *_ in SNAPSHOT_LAYOUT))
+        self.refresh()
+        aggregates = {attribute: AttributeAggregate() for attribute in reductions}
+        with self.lock.reading():
+            results = self._scatter(_aggregate_in_shard, dict.fromkeys(self.segments, (tables, tuple(reductions))))
+            for key, partials in results.items():
+                view = self.views[key]
+                for (table, attribute), partial in partials.items():
+                    count, total, maximum, max_row, minimum, min_row, numeric = partial
+                    category = getattr(view, table)
+                    aggregate = aggregates[attribute]
+                    aggregate.merge(count, total, maximum, category.materialize(max_row),
+                                    minimum, category.materialize(min_row))
+                    aggregate.numeric = aggregate.numeric and numeric
+        return {attribute: aggregates[attribute].result(operations)
+                for attribute, operations in reductions.items()}
+
+    def find_max_value(self, attribute="height", tables=None):
+        """Аналог EquipmentManager.find_max_value по всем шардам"""
+        if not len(self):
+            raise ValueError("The list is empty or contains no elements.")
+        item = self.aggregate({attribute: ("argmax",)}, tables)[attribute]["argmax"]
+        if item is None:
+            raise AttributeError(f"Attribute '{attribute}' does not exist in the object.")
+        return item
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        with self.lock.writing():
+            self._release()
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_CONCURRENCY = 32
+SERVICE_MAX_BODY = 2 ** 20
+SERVICE_IDLE_TIMEOUT = 15.0
+
+# Поля пользователя в JSON в порядке аргументов конструктора User
+USER_FIELDS = (("name", text), ("age", int), ("gender", text), ("skill", text), ("height", float),
+               ("weight", float), ("clothing_size", text), ("leg_size", float), ("fasteners", text),
+               ("helmet_size", text))
+EQUIPMENT_TYPES = {cls: kind for kind, (cls, _) in IMPORT_FIELDS.items()}
+
+class ServiceError(CustomError):
+    """Ошибка запроса к сервису с HTTP-статусом ответа"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def equipment_json(item):
+    cls = equipment_class(item)
+    attribute = EQUIPMENT_ATTRIBUTES[cls]
+    return {"type": EQUIPMENT_TYPES[cls], "name": item.name, "gender": item.gender,
+            "skill": item.skill, attribute: getattr(item, attribute),
+            "created_at": item.created_at.isoformat()}
+
+def user_json(user):
+    return {field: getattr(user, field) for field, _ in USER_FIELDS}
+
+def parse_user_fields(payload, required=True):
+    """Поля пользователя из JSON с приведением типов как в User.from_input"""
+    if not isinstance(payload, dict):
+        raise InvalidInputError("Expected a JSON object.")
+    unknown = set(payload) - {field for field, _ in USER_FIELDS}
+    if unknown:
+        raise InvalidInputError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+    fields = {}
+    try:
+        for field, convert in USER_FIELDS:
+            if field in payload:
+                fields[field] = convert(payload[field])
+            elif required:
+                raise ValueError(f"missing field '{field}'")
+    except (TypeError, ValueError) as e:
+        raise InvalidInputError(f"Invalid input: {e}")
+    return fields
+
+def parse_days(value):
+    days = value if isinstance(value, list) else [value]
+    if not days or not all(isinstance(day, int) and not isinstance(day, bool) and 0 < day <= 365
+                           for day in days):
+        raise InvalidInputError("days must be an integer or a list of integers from 1 to 365.")
+    return days
+
+class EquipmentService:
+    """HTTP/JSON-сервис поверх каталога на asyncio без сторонних библиотек.
+
+    Соединения keep-alive, запросы одного соединения можно отправлять конвейером
+    (pipelining): они разбираются по очереди и ответы идут в том же порядке. Работа
+    с каталогом выполняется в пуле потоков, число одновременных запросов ограничено
+    семафором. Маршруты:
+
+        POST  /equipment                     добавить позицию (поля как в импорте CSV/JSONL)
+        POST  /users                         создать пользователя
+        PATCH /users/{name}                  изменить поля пользователя
+        GET   /users/{name}/recommendation   подбор снаряжения
+        POST  /quote                         {"user": имя, "days": n или [n, ...]} - цена подобранного комплекта
+    """
+
+    ROUTES = (
+        ("POST", ("equipment",), "add_equipment"),
+        ("POST", ("users",), "create_user"),
+        ("PATCH", ("users", None), "edit_user"),
+        ("GET", ("users", None, "recommendation"), "recommend"),
+        ("POST", ("quote",), "rental_quote"),
+    )
+
+    def __init__(self, catalog, recommender=None, concurrency=SERVICE_CONCURRENCY,
+                 max_body=SERVICE_MAX_BODY, idle_timeout=SERVICE_IDLE_TIMEOUT):
+        self.catalog = catalog if isinstance(catalog, ConcurrentCatalog) else ConcurrentCatalog(catalog)
+        self.recommender = recommender or self.catalog
+        self.users = {}
+        self.users_lock = threading.Lock()
+        self.prices = PriceTable()
+        self.concurrency = concurrency
+        self.max_body = max_body
+        self.idle_timeout = idle_timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="service")
+        self.slots = None
+        self.server = None
+        self.port = None
+        self.connections = set()
+        self.requests = Counter()
+
+    async def start(self, host=SERVICE_HOST, port=SERVICE_PORT):
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.server = await asyncio.start_server(self._serve_connection, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        log_action(f"Equipment service listening on http://{host}:{self.port}")
+        return self.port
+
+    async def close(self):
+        self.server.close()
+        for writer in list(self.connections):
+            writer.close()
+        await self.server.wait_closed()
+        self.executor.shutdown(wait=True)
+        log_action(f"Equipment service stopped; requests served: {dict(self.requests)}")
+
+    async def _serve_connection(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.idle_timeout)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    writer.write(self._response(431, {"error": "Request header is too large."}, False))
+                    break
+                status, body, keep_alive = await self._handle(head, reader)
+                writer.write(self._response(status, body, keep_alive))
+                # drain ждет только при заполненном буфере отправки, конвейер не сбивается
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def _handle(self, head, reader):
+        """Разбор одного запроса: (статус, тело ответа, оставить ли соединение открытым)"""
+        try:
+            request_line, *header_lines = head[:-4].decode("latin-1").split("\r\n")
+            method, target, version = request_line.split(" ")
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        except ValueError:
+            return 400, {"error": "Malformed request."}, False
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            return 501, {"error": "Chunked request bodies are not supported."}, False
+        try:
+            length = int(headers.get("content-length", "0"))
+        except ValueError:
+            return 400, {"error": "Invalid Content-Length."}, False
+        if not 0 <= length <= self.max_body:
+            return 413, {"error": f"Request body is limited to {self.max_body} bytes."}, False
+        try:
+            body = await reader.readexactly(length) if length else b""
+        except asyncio.IncompleteReadError:
+            return 400, {"error": "Incomplete request body."}, False
+
+        try:
+            handler, arguments = self._route(method, target)
+            payload = json.loads(body) if body else {}
+            async with self.slots:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self.executor, handler, payload, *arguments)
+            self.requests[handler.__name__] += 1
+            return *result, keep_alive
+        except ServiceError as e:
+            return e.status, {"error": str(e)}, keep_alive
+        except EquipmentNotFoundError as e:
+            return 404, {"error": str(e)}, keep_alive
+        except (CustomError, ValueError) as e:
+            return 400, {"error": str(e)}, keep_alive
+        except Exception as e:
+            log_action(f"Service error on {method} {target}: {e!r}")
+            return 500, {"error": "Internal server error."}, keep_alive
+
+    def _route(self, method, target):
+        parts = tuple(urllib.parse.unquote(part) for part in target.split("?", 1)[0].strip("/").split("/"))
+        allowed = False
+        for route_method, pattern, name in self.ROUTES:
+            if len(pattern) != len(parts) or any(fixed is not None and fixed != part
+                                                 for fixed, part in zip(pattern, parts)):
+                continue
+            if route_method == method:
+                return getattr(self, name), [part for fixed, part in zip(pattern, parts) if fixed is None]
+            allowed = True
+        if allowed:
+            raise ServiceError(405, f"Method {method} is not allowed for {target}.")
+        raise ServiceError(404, f"Unknown resource: {target}")
+
+    @staticmethod
+    def _response(status, body, keep_alive):
+        content = json.dumps(body).encode("utf-8")
+        return (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(content)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + content
+
+    def _user(self, name):
+        with self.users_lock:
+            user = self.users.get(name)
+        if user is None:
+            raise EquipmentNotFoundError(f"User {name} not found.")
+        return user
+
+    def add_equipment(self, payload):
+        if not isinstance(payload, dict):
+            raise InvalidInputError("Expected a JSON object.")
+        cls, args = parse_import_record(payload)
+        # Проверка дубликата до создания объекта: отказ не должен менять total_equipment и лог
+        probe = import_probe(cls, args)
+        with self.catalog.writing() as catalog:
+            if probe in catalog.collection_for(probe):
+                raise ServiceError(409, f"{probe.name} ({payload['type']}) is already in the catalog.")
+            item = cls(*args)
+            catalog.add(item)
+        return 201, {"item": equipment_json(item)}
+
+    def create_user(self, payload):
+        fields = parse_user_fields(payload)
+        with self.users_lock:
+            if fields["name"] in self.users:
+                raise ServiceError(409, f"User {fields['name']} already exists.")
+            user = self.users[fields["name"]] = User(*fields.values())
+        return 201, {"user": user_json(user)}
+
+    def edit_user(self, payload, name):
+        fields = parse_user_fields(payload, required=False)
+        with self.users_lock:
+            user = self.users.get(name)
+            if user is None:
+                raise EquipmentNotFoundError(f"User {name} not found.")
+            new_name = fields.get("name", name)
+            if new_name != name and new_name in self.users:
+                raise ServiceError(409, f"User {new_name} already exists.")
+            for field, value in fields.items():
+                setattr(user, field, value)
+                log_action(f"User {field.replace('_', ' ')} updated to: {value}")
+            if new_name != name:
+                self.users[new_name] = self.users.pop(name)
+        return 200, {"user": user_json(user)}
 
-    @classmethod
-    def from_input(cls):
-        try:
-            name = input("Enter name: ")
-            age = int(input("Enter age: "))
-            gender = input("Enter gender: ")
-            skill = input("Enter skill level (beginner, intermediate, advanced): ")
-            height = float(input("Enter height (in cm): "))
-            weight = float(input("Enter weight (in kg): "))
-            clothing_size = input("Enter clothing size: ")
-            leg_size = float(input("Enter leg size (in cm): "))
-            fasteners_size = input("Enter fasteners size: ")
-            helmet_size = input("Enter helmet size: ")
-            return cls(name, age, gender, skill, height, weight, clothing_size, leg_size, fasteners_size, helmet_size)
-        except ValueError as e:
-            raise InvalidInputError(f"Invalid input: {e}")
+    def recommend(self, payload, name):
+        user = self._user(name)
+        recommendation = self.recommender.recommend(user)
+        return 200, {"user": user.name,
+                     "items": {category: None if item is None else equipment_json(item)
+                               for category, item in zip(Recommendation.CATEGORIES,
+                                                         map(recommendation.get, Recommendation.CATEGORIES))},
+                     "misses": recommendation.misses(),
+                     "timed_out": list(recommendation.timed_out)}
 
-    def update_skill(self, new_skill):
-        self.skill = new_skill
-        log_action(f"User {self.name} skill updated to: {self.skill}")
-        print(f"Skill updated to: {self.skill}")
+    def rental_quote(self, payload):
+        if not isinstance(payload, dict) or "user" not in payload:
+            raise InvalidInputError("Expected {\"user\": name, \"days\": n}.")
+        user = self._user(str(payload["user"]))
+        days = parse_days(payload.get("days", 1))
+        recommendation = self.recommender.recommend(user)
+        items = [item for item in map(recommendation.get, Recommendation.CATEGORIES) if item is not None]
+        return 200, {"user": user.name, "days": days,
+                     "items": [dict(equipment_json(item), prices=[self.prices.price(item, day) for day in days])
+                               for item in items],
+                     "total": self.prices.quote(items, days),
+                     "misses": recommendation.misses()}
 
-class Board(Equipment):
-    def __init__(self, name, gender, skill, height):
-        super().__init__(name, gender, skill)
-        self.height = height
-        self.type = "Snowboard"
+@contextmanager
+def quiet_logging():
+    """Отключает логирование и вывод LOG-сообщений на время бенчмарков"""
+    logging.disable(logging.INFO)
+    try:
+        with redirect_stdout(io.StringIO()):
+            yield
+    finally:
+        logging.disable(logging.NOTSET)
 
-    def __str__(self):
-        return f"Board(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill}, Height: {self.height})"
+GENDERS = ("male", "female")
+SKILLS = ("beginner", "intermediate", "advanced")
+SIZES = ("S", "M", "L", "XL")
 
-    def __repr__(self):
-        return f"Board(name='{self.name}', gender='{self.gender}', skill='{self.skill}', height={self.height})"
+def generate_rows(count, seed=0):
+    """Случайные аргументы конструкторов: count позиций каждой категории"""
+    rng = random.Random(seed)
+    rows = {Board: [], Boots: [], Fasteners: [], Helmet: []}
+    for i in range(count):
+        rows[Board].append((f"Board{i}", rng.choice(GENDERS), rng.choice(SKILLS), rng.randint(140, 200)))
+        rows[Boots].append((f"Boots{i}", rng.choice(GENDERS), rng.choice(SKILLS), float(rng.randint(35, 46))))
+        rows[Fasteners].append((f"Fasteners{i}", rng.choice(GENDERS), rng.choice(SKILLS), rng.choice(SIZES)))
+        rows[Helmet].append((f"Helmet{i}", rng.choice(GENDERS), rng.choice(SIZES)))
+    return rows
 
-    def get_usage_instructions(self):
-        return f"Attach boots to {self.name} board using fasteners. Suitable for {self.skill} level."
+def generate_catalog(count, seed=0):
+    """Случайный каталог: count позиций каждой категории"""
+    catalog = EquipmentCatalog()
+    for cls, cls_rows in generate_rows(count, seed).items():
+        for item in cls.bulk_create(cls_rows):
+            catalog.add(item)
+    return catalog
 
-    def calculate_rental_price(self, days):
-        base_price = 30 if self.skill == "beginner" else 40 if self.skill == "intermediate" else 50
-        return base_price * days * (1 + 0.1 * (self.height / 100))
+def generate_users(count, seed=0):
+    rng = random.Random(seed)
+    return [User(f"User{i}", rng.randint(12, 70), rng.choice(GENDERS), rng.choice(SKILLS),
+                 float(rng.randint(140, 200)), float(rng.randint(40, 110)), rng.choice(SIZES),
+                 float(rng.randint(35, 46)), rng.choice(SIZES), rng.choice(SIZES))
+            for i in range(count)]
 
-    def perform_trick(self, trick_name):
-        log_action(f"Board {self.name} performing trick: {trick_name}")
-        return f"{self.name} is performing {trick_name} trick!"
+def measure_object_size(factory, count):
+    """Средний объем памяти на объект по tracemalloc"""
+    with quiet_logging():
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [factory(i) for i in range(count)]
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    del objects
+    return (after - before) / count
 
-    @classmethod
-    def from_input(cls):
-        try:
-            name = input("Enter board name: ")
-            gender = input("Enter gender: ")
-            skill = input("Enter skill level (beginner, intermediate, advanced): ")
-            height = float(input("Enter recommended height (in cm): "))
-            return cls(name, gender, skill, height)
-        except ValueError as e:
-            raise InvalidInputError(f"Invalid input: {e}")
+def benchmark_memory(count=1000000):
+    factories = {
+        "Board": lambda i: Board(f"Board{i}", "male", "beginner", 170.0),
+        "Boots": lambda i: Boots(f"Boots{i}", "male", "beginner", 42.0),
+        "Fasteners": lambda i: Fasteners(f"Fasteners{i}", "male", "beginner", "M"),
+        "Helmet": lambda i: Helmet(f"Helmet{i}", "male", "M"),
+        "DerivedEquipment": lambda i: DerivedEquipment(f"Derived{i}", "male", "beginner", "info"),
+        "User": lambda i: User(f"User{i}", 30, "male", "beginner", 175.0, 70.0, "M", 42.0, "M", "M"),
+    }
+    print(f"Memory per object, {count} instances (including name string and created_at)")
+    for name, factory in factories.items():
+        print(f"{name:>17}: {measure_object_size(factory, count):.0f} B")
 
-class Boots(Equipment):
-    def __init__(self, name, gender, skill, leg_size):
-        super().__init__(name, gender, skill)
-        self.leg_size = leg_size
-        self.comfort_level = "medium"
+def benchmark_pricing(count=100000, days=tuple(range(1, 31))):
+    with quiet_logging():
+        catalog = generate_catalog(count // 4)
+    items = list(catalog)
+    start = time.perf_counter()
+    expected = [sum(item.calculate_rental_price(day) for item in items) for day in days]
+    per_item = time.perf_counter() - start
+    start = time.perf_counter()
+    totals = RentalPricingEngine(items).totals(days)
+    batched = time.perf_counter() - start
+    assert all(math.isclose(a, b) for a, b in zip(expected, totals))
+    backend = "numpy" if np is not None else "pure Python"
+    print(f"Pricing {len(items)} items x {len(days)} day counts: per-item {per_item:.3f} s, "
+          f"RentalPricingEngine ({backend}) {batched:.3f} s")
 
-    def __str__(self):
-        return f"Boots(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill}, Leg Size: {self.leg_size})"
+def benchmark_price_table(count=100000, days=tuple(range(1, 31))):
+    with quiet_logging():
+        catalog = generate_catalog(count // 4)
+        table = PriceTable(catalog)
+        new_items = Board.bulk_create((f"NewBoard{i}", "male", "advanced", 150 + i % 50) for i in range(1000))
+        for item in new_items:
+            catalog.add(item)
+    items = list(catalog)
+    start = time.perf_counter()
+    expected = [sum(item.calculate_rental_price(day) for item in items) for day in days]
+    per_item = time.perf_counter() - start
+    start = time.perf_counter()
+    totals = table.fleet_quote(days)
+    lookup = time.perf_counter() - start
+    assert all(math.isclose(a, b) for a, b in zip(expected, totals))
+    stats = table.stats()
+    print(f"Price table for {len(items)} items: {stats['rates']} rates, "
+          f"rebuild {stats['rebuild_seconds'] * 1000:.1f} ms, "
+          f"{stats['updates']} incremental updates {stats['update_seconds'] * 1000:.1f} ms")
+    print(f"Fleet quote x {len(days)} day counts: per-item {per_item:.3f} s, table {lookup * 1000:.2f} ms")
 
-    def __repr__(self):
-        return f"Boots(name='{self.name}', gender='{self.gender}', skill='{self.skill}', leg_size={self.leg_size})"
+def rss_kb():
+    """Текущий RSS процесса в КБ (Linux), иначе пиковый RSS; 0, если измерить нечем (Windows)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        try:
+            import resource
+        except ImportError:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
 
-    def get_usage_instructions(self):
-        return f"Wear {self.name} boots and secure them properly. Size: {self.leg_size}"
+def _snapshot_startup(path, users_count, results):
+    rss_before = rss_kb()
+    start = time.perf_counter()
+    catalog = MappedCatalog(path)
+    opened = time.perf_counter() - start
+    with quiet_logging():
+        users = generate_users(users_count)
+        start = time.perf_counter()
+        recommend_many(users, catalog)
+    recommended = time.perf_counter() - start
+    results.put(("mmap snapshot", opened, recommended, rss_kb() - rss_before))
 
-    def calculate_rental_price(self, days):
-        return 15 * days * (1.2 if self.gender == "female" else 1.0)
+def _object_startup(count, users_count, results):
+    rss_before = rss_kb()
+    rows = generate_rows(count)
+    start = time.perf_counter()
+    with quiet_logging():
+        catalog = EquipmentCatalog()
+        for cls, cls_rows in rows.items():
+            for row in cls_rows:
+                catalog.add(cls(*row))
+    opened = time.perf_counter() - start
+    with quiet_logging():
+        users = generate_users(users_count)
+        start = time.perf_counter()
+        recommend_many(users, catalog)
+    recommended = time.perf_counter() - start
+    results.put(("object rebuild", opened, recommended, rss_kb() - rss_before))
 
-    def adjust_comfort(self, level):
-        self.comfort_level = level
-        log_action(f"Boots {self.name} comfort adjusted to {level}")
-        return f"Comfort level adjusted to {level}"
+def benchmark_snapshot(count=1000000, users_count=1000, path="benchmark_catalog.snap"):
+    per_category = count // 4
+    with quiet_logging():
+        write_snapshot(generate_catalog(per_category), path)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    print(f"Startup with {count} items, then recommend_many for {users_count} users")
+    try:
+        for target, args in ((_snapshot_startup, (path, users_count, results)),
+                             (_object_startup, (per_category, users_count, results))):
+            process = context.Process(target=target, args=args)
+            process.start()
+            name, opened, recommended, rss = results.get()
+            process.join()
+            print(f"{name:>15}: startup {opened:.3f} s, recommend {recommended:.3f} s, RSS +{rss / 1024:.0f} MB")
+    finally:
+        os.remove(path)
 
-    @classmethod
-    def from_input(cls):
+def write_import_file(path, count, seed=0, duplicate_every=10, invalid_every=100):
+    """Тестовый файл поставщика: каждая duplicate_every-я строка - повтор, каждая invalid_every-я - ошибка"""
+    rows = generate_rows(count // 4 + 1, seed)
+    fields = {cls: [field for field, _ in cls_fields] for cls, cls_fields in IMPORT_FIELDS.values()}
+    kinds = {cls: kind for kind, (cls, _) in IMPORT_FIELDS.items()}
+    records = ({"type": kinds[cls], **dict(zip(fields[cls], row))}
+               for row_group in zip(*rows.values()) for cls, row in zip(rows, row_group))
+    previous = None
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, ["type", "name", "gender", "skill", "height", "leg_size",
+                                       "fasteners_size", "helmet_size"]) if path.endswith(".csv") else None
+        if writer is not None:
+            writer.writeheader()
+        for index, record in enumerate(islice(records, count), 1):
+            if index % invalid_every == 0:
+                record = dict(record, type="skis")
+            elif index % duplicate_every == 0 and previous is not None:
+                record = previous
+            previous = record
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                file.write(json.dumps(record) + "\n")
+
+def benchmark_import(count=400000):
+    print(f"Streaming import of {count} rows (~10% duplicates, 1% invalid)")
+    for path in ("benchmark_import.csv", "benchmark_import.jsonl"):
+        write_import_file(path, count)
         try:
-            name = input("Enter boots name: ")
-            gender = input("Enter gender: ")
-            skill = input("Enter skill level (beginner, intermediate, advanced): ")
-            leg_size = float(input("Enter leg size (in cm): "))
-            return cls(name, gender, skill, leg_size)
-        except ValueError as e:
-            raise InvalidInputError(f"Invalid input: {e}")
+            with quiet_logging():
+                tracemalloc.start()
+                catalog = EquipmentCatalog()
+                report = import_equipment(path, catalog)
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            # Все, что сверх итогового каталога, - буферы чтения и текущая пачка
+            print(f"{path:>22}: {report.summary()}, transient memory {(peak - current) / 2 ** 20:.1f} MB")
+        finally:
+            os.remove(path)
 
-class Fasteners(Equipment):
-    def __init__(self, name, gender, skill, fasteners_size):
-        super().__init__(name, gender, skill)
-        self.fasteners = fasteners_size
-        self.adjustment = "medium"
+def _journal_writer(journal, records):
+    for record in records:
+        journal.record(record)
 
-    def __str__(self):
-        return f"Fasteners(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill}, Fasteners Size: {self.fasteners})"
+def benchmark_journal(count=200000, writes=4000, threads=(1, 4, 16), path="benchmark_catalog.journal"):
+    with quiet_logging():
+        catalog = generate_catalog(count // 4)
+    records = [encode_mutation(JOURNAL_ADD, category, item)
+               for category, (table, *_) in enumerate(SNAPSHOT_LAYOUT)
+               for item in getattr(catalog, table)]
+    print(f"Group commit: {writes} durable writes (one fsync wait per write)")
+    for workers in threads:
+        journal = MutationJournal(path)
+        chunk = writes // workers
+        pool = [threading.Thread(target=_journal_writer, args=(journal, records[i * chunk:(i + 1) * chunk]))
+                for i in range(workers)]
+        start = time.perf_counter()
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        journal.close()
+        os.remove(path)
+        print(f"{workers:>3} writer threads: {chunk * workers / elapsed:,.0f} writes/s, "
+              f"{chunk * workers / journal.fsyncs:.1f} records per fsync")
+    journal = MutationJournal(path)
+    for record in records:
+        journal.append(record)
+    journal.close()
+    size = os.path.getsize(path)
+    try:
+        with quiet_logging():
+            restored = JournaledCatalog(f"{path}.snap", path, compact_bytes=float("inf"))
+            restored.close()
+        assert len(restored) == len(catalog)
+        print(f"Replay of {restored.replayed} records ({size / 2 ** 20:.1f} MB): {restored.replay_seconds:.2f} s, "
+              f"{restored.replayed / restored.replay_seconds:,.0f} records/s")
+    finally:
+        os.remove(path)
 
-    def __repr__(self):
-        return f"Fasteners(name='{self.name}', gender='{self.gender}', skill='{self.skill}', fasteners_size='{self.fasteners}')"
+def _clerk_reader(shared, users, stop, latencies):
+    position = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        shared.recommend(users[position % len(users)])
+        latencies.append(time.perf_counter() - start)
+        position += 1
 
-    def get_usage_instructions(self):
-        return f"Use {self.name} fasteners to secure boots to board. Size: {self.fasteners}"
+def _clerk_writer(shared, prefix, stop, written):
+    rng = random.Random(prefix)
+    while not stop.is_set():
+        index = len(written)
+        shared.add(Board(f"{prefix}Board{index}", rng.choice(GENDERS), rng.choice(SKILLS), rng.randint(140, 200)))
+        shared.add(Boots(f"{prefix}Boots{index}", rng.choice(GENDERS), rng.choice(SKILLS), float(rng.randint(35, 46))))
+        written.append(index)
+        time.sleep(0.001)
 
-    def calculate_rental_price(self, days):
-        return 10 * days
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
 
-    def adjust_tightness(self, level):
-        self.adjustment = level
-        log_action(f"Fasteners {self.name} tightness adjusted to {level}")
-        return f"Tightness adjusted to {level}"
+def benchmark_concurrency(catalog_size=2000, duration=2.0, readers=(1, 2, 4, 8), writers=2):
+    with quiet_logging():
+        shared = ConcurrentCatalog(generate_catalog(catalog_size))
+        users = generate_users(500)
+    print(f"Recommendations with {writers} writer threads adding items, {duration:.0f} s per run "
+          f"({os.cpu_count()} CPU, GIL {'on' if getattr(sys, '_is_gil_enabled', lambda: True)() else 'off'})")
+    for count in readers:
+        stop = threading.Event()
+        latencies = [[] for _ in range(count)]
+        written = [[] for _ in range(writers)]
+        created_before = Equipment.get_total_equipment()
+        threads = ([threading.Thread(target=_clerk_reader, args=(shared, users, stop, latencies[i]))
+                    for i in range(count)] +
+                   [threading.Thread(target=_clerk_writer, args=(shared, f"R{count}W{i}", stop, written[i]))
+                    for i in range(writers)])
+        with quiet_logging():
+            for thread in threads:
+                thread.start()
+            time.sleep(duration)
+            stop.set()
+            for thread in threads:
+                thread.join()
+        samples = [latency for reader in latencies for latency in reader]
+        added = 2 * sum(len(items) for items in written)
+        assert Equipment.get_total_equipment() - created_before == added
+        with shared.reading() as catalog:
+            for collection in (catalog.boards, catalog.boots):
+                assert sum(len(bucket) for bucket in collection.buckets.values()) == len(collection)
+        print(f"{count:>2} readers: {len(samples) / duration:,.0f} recommendations/s, "
+              f"p50 {percentile(samples, 0.5) * 1000:.2f} ms, p99 {percentile(samples, 0.99) * 1000:.2f} ms, "
+              f"{added} items added")
 
-    @classmethod
-    def from_input(cls):
+def _full_copy(catalog):
+    """Наивная публикация версии: копия всех групп и множеств каталога"""
+    copied = {}
+    for table, *_ in VERSIONED_LAYOUT:
+        collection = getattr(catalog, table)
+        copied[table] = ({key: list(bucket) for key, bucket in collection.buckets.items()}, set(collection))
+    return copied
+
+def _report_reader(versions, days, results):
+    version = versions.pin()
+    totals = RentalPricingEngine(version).totals(days)
+    results.append((version, totals))
+
+def benchmark_versions(sizes=(10000, 100000, 1000000), publishes=1000, days=tuple(range(1, 31))):
+    print(f"Publishing {publishes} single-item versions vs one naive full copy of the catalog")
+    for size in sizes:
+        with quiet_logging():
+            catalog = generate_catalog(size // 4)
+            start = time.perf_counter()
+            versions = VersionedCatalog(catalog)
+            built = time.perf_counter() - start
+            new_items = Board.bulk_create((f"NewBoard{i}", GENDERS[i % 2], SKILLS[i % 3], 140 + i % 60)
+                                          for i in range(publishes))
+        start = time.perf_counter()
+        for item in new_items:
+            versions.add(item)
+        published = (time.perf_counter() - start) / publishes
+        start = time.perf_counter()
+        _full_copy(catalog)
+        copied = time.perf_counter() - start
+        print(f"{size:>8} items: initial build {built:.2f} s, publish {published * 1e6:.0f} us/version, "
+              f"full copy {copied * 1000:.1f} ms/version")
+    results = []
+    reader = threading.Thread(target=_report_reader, args=(versions, days, results))
+    published = 0
+    with quiet_logging():
+        stock = Boots.bulk_create((f"NewBoots{i}", GENDERS[i % 2], SKILLS[i % 3], float(35 + i % 12))
+                                  for i in range(100000))
+        start = time.perf_counter()
+        reader.start()
+        while reader.is_alive() and published < len(stock):
+            versions.add(stock[published])
+            published += 1
+        reader.join()
+        elapsed = time.perf_counter() - start
+    version, totals = results[0]
+    assert totals == RentalPricingEngine(version).totals(days)
+    print(f"Fleet report over pinned version {version.number} ({len(version)} items) took {elapsed:.2f} s; "
+          f"{published} versions published meanwhile, report unaffected")
+
+def _latencies(recommend, users):
+    samples = []
+    for user in users:
+        start = time.perf_counter()
+        recommend(user)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def benchmark_parallel(catalog_size=2000, users_count=500, timeout=5.0):
+    with quiet_logging():
+        catalog = generate_catalog(catalog_size)
+        users = generate_users(users_count)
+    print(f"Latency per user over {users_count} users, catalog of {catalog_size} items per category "
+          f"({os.cpu_count()} CPU)")
+    for scored in (False, True):
+        mode = "scored (top-1 by score_equipment)" if scored else "first match"
+        runs = [("sequential", lambda user: Recommendation(**{
+            category: recommend_category(user, category, catalog, scored)
+            for category in Recommendation.CATEGORIES}))]
+        recommenders = [ParallelRecommender(catalog, executor, timeout, scored, f"benchmark_{executor}.snap")
+                        for executor in ("thread", "process")]
+        runs += [(f"{recommender.executor} pool", recommender.recommend) for recommender in recommenders]
         try:
-            name = input("Enter fasteners name: ")
-            gender = input("Enter gender: ")
-            skill = input("Enter skill level (beginner, intermediate, advanced): ")
-            fasteners_size = input("Enter fasteners size: ")
-            return cls(name, gender, skill, fasteners_size)
-        except ValueError as e:
-            raise InvalidInputError(f"Invalid input: {e}")
+            for name, recommend in runs:
+                with quiet_logging():
+                    recommend(users[0])
+                    samples = _latencies(recommend, users)
+                print(f"{mode:>34}, {name:>12}: p50 {percentile(samples, 0.5) * 1000:.2f} ms, "
+                      f"p99 {percentile(samples, 0.99) * 1000:.2f} ms")
+        finally:
+            for recommender in recommenders:
+                recommender.close()
 
-class Helmet(Equipment):
-    def __init__(self, name, gender, helmet_size):
-        super().__init__(name, gender, "all")
-        self.size = helmet_size
-        self.ventilation = "open"
+def benchmark_shared(catalog_size=200000, users_count=100000, workers=None):
+    with quiet_logging():
+        catalog = generate_catalog(catalog_size)
+        users = generate_users(users_count)
+    reductions = {"height": ("argmax", "mean"), "leg_size": ("argmin", "mean")}
+    print(f"Shared-memory shards, {len(catalog)} items, {users_count} users ({os.cpu_count()} CPU)")
+    start = time.perf_counter()
+    payload = pickle.dumps([list(getattr(catalog, table)) for table, *_ in SNAPSHOT_LAYOUT])
+    print(f"  pickling the catalog for workers instead: {len(payload) / 2 ** 20:.0f} MB, "
+          f"{time.perf_counter() - start:.2f} s per worker")
+    del payload
+    # Базовая линия - тот же формат снимка в памяти одного процесса, без шардов и пула
+    local = MappedCatalog.from_buffer(b"".join(snapshot_parts(catalog)), "in-process")
+    with quiet_logging():
+        start = time.perf_counter()
+        recommend_many(users, local)
+        recommend_time = time.perf_counter() - start
+        local.close()
+        start = time.perf_counter()
+        EquipmentManager.aggregate([catalog.boards, catalog.boots], reductions)
+        aggregate_time = time.perf_counter() - start
+    print(f"{'in-process':>12}: recommend_many {recommend_time:.2f} s, aggregate {aggregate_time:.2f} s")
+    for count in workers or sorted({1, 2, 4, os.cpu_count()}):
+        with quiet_logging():
+            start = time.perf_counter()
+            shared = SharedCatalog(catalog, count)
+            build_time = time.perf_counter() - start
+            try:
+                shared.aggregate(reductions)
+                start = time.perf_counter()
+                shared.recommend_many(users)
+                recommend_time = time.perf_counter() - start
+                start = time.perf_counter()
+                shared.aggregate(reductions)
+                aggregate_time = time.perf_counter() - start
+                size = shared.nbytes()
+                shards = len(shared.segments)
+            finally:
+                shared.close()
+        print(f"{count:>4} workers: recommend_many {recommend_time:.2f} s, aggregate {aggregate_time:.2f} s "
+              f"({shards} shards, {size / 2 ** 20:.0f} MB shared, built in {build_time:.2f} s)")
 
-    def __str__(self):
-        return f"Helmet(Name: {self.name}, Gender: {self.gender}, Size: {self.size})"
+def http_request(method, path, payload=None, host=SERVICE_HOST):
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    return (f"{method} {urllib.parse.quote(path)} HTTP/1.1\r\nHost: {host}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
 
-    def __repr__(self):
-        return f"Helmet(name='{self.name}', gender='{self.gender}', helmet_size='{self.size}')"
+def service_workload(prefix, users, count, seed=0):
+    """Смесь запросов киоска: подбор, расчет цены, правка профиля, добавление позиции"""
+    rng = random.Random(seed)
+    requests = []
+    for number in range(count):
+        user = rng.choice(users)
+        roll = rng.random()
+        if roll < 0.6:
+            requests.append(http_request("GET", f"/users/{user.name}/recommendation"))
+        elif roll < 0.85:
+            requests.append(http_request("POST", "/quote", {"user": user.name, "days": [1, 3, 7]}))
+        elif roll < 0.95:
+            requests.append(http_request("PATCH", f"/users/{user.name}", {"height": float(rng.randint(140, 200))}))
+        else:
+            requests.append(http_request("POST", "/equipment", {
+                "type": "board", "name": f"{prefix}Board{number}", "gender": rng.choice(GENDERS),
+                "skill": rng.choice(SKILLS), "height": rng.randint(140, 200)}))
+    return requests
 
-    def get_usage_instructions(self):
-        return f"Wear {self.name} helmet and secure the strap. Size: {self.size}"
+async def _load_connection(host, port, requests, pipeline, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for start in range(0, len(requests), pipeline):
+            batch = requests[start:start + pipeline]
+            sent = time.perf_counter()
+            writer.write(b"".join(batch))
+            await writer.drain()
+            for _ in batch:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - sent)
+                statuses[int(head.split(b" ", 2)[1])] += 1
+    finally:
+        writer.close()
+        await writer.wait_closed()
 
-    def calculate_rental_price(self, days):
-        return 8 * days * (1.1 if self.gender == "female" else 1.0)
+async def run_load(host, port, requests, connections=16, pipeline=1):
+    """Отправка запросов по connections keep-alive соединениям пачками по pipeline.
 
-    def adjust_ventilation(self, status):
-        self.ventilation = status
-        log_action(f"Helmet {self.name} ventilation adjusted to {status}")
-        return f"Ventilation adjusted to {status}"
+    Возвращает (секунды, задержки запросов, Counter статусов); задержка запроса в пачке
+    считается от отправки пачки до получения его ответа.
+    """
+    latencies = []
+    statuses = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(_load_connection(host, port, requests[number::connections], pipeline,
+                                            latencies, statuses)
+                           for number in range(min(connections, len(requests)))))
+    return time.perf_counter() - start, latencies, statuses
 
-    @classmethod
-    def from_input(cls):
-        try:
-            name = input("Enter helmet name: ")
-            gender = input("Enter gender: ")
-            helmet_size = input("Enter helmet size: ")
-            return cls(name, gender, helmet_size)
-        except ValueError as e:
-            raise InvalidInputError(f"Invalid input: {e}")
+async def load_test(host, port, prefix="Load", users_count=200, count=20000,
+                    connections=(1, 16, 64), pipelines=(1, 8)):
+    users = generate_users(users_count)
+    for user in users:
+        user.name = f"{prefix}{user.name}"
+    await run_load(host, port, [http_request("POST", "/users", user_json(user)) for user in users])
+    results = []
+    for connection_count in connections:
+        for pipeline in pipelines:
+            requests = service_workload(f"{prefix}{connection_count}x{pipeline}", users, count,
+                                        seed=connection_count * 100 + pipeline)
+            elapsed, latencies, statuses = await run_load(host, port, requests, connection_count, pipeline)
+            errors = sum(number for status, number in statuses.items() if status >= 400)
+            results.append((connection_count, pipeline, count / elapsed, percentile(latencies, 0.5),
+                            percentile(latencies, 0.99), percentile(latencies, 0.999), errors))
+    return results
 
-class EquipmentManager:
-    @staticmethod
-    def find_max_value(items_2d, attribute="height"):
-        if not items_2d or not any(items_2d):
-            raise ValueError("The list is empty or contains no elements.")
+def print_load_results(results):
+    for connection_count, pipeline, rps, p50, p99, p999, errors in results:
+        print(f"{connection_count:>3} connections x pipeline {pipeline}: {rps:,.0f} req/s, "
+              f"p50 {p50 * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms, p99.9 {p999 * 1000:.2f} ms, "
+              f"errors {errors}")
 
-        max_item = None
-        max_value = float('-inf')
+def benchmark_service(catalog_size=2000, users_count=200, count=20000):
+    with quiet_logging():
+        catalog = ConcurrentCatalog(generate_catalog(catalog_size))
 
-        for row in items_2d:
-            for item in row:
-                if not hasattr(item, attribute):
-                    raise AttributeError(f"Attribute '{attribute}' does not exist in the object.")
-                current_value = getattr(item, attribute)
-                if current_value > max_value:
-                    max_value = current_value
-                    max_item = item
+    async def scenario():
+        service = EquipmentService(catalog)
+        port = await service.start(port=0)
+        try:
+            return await load_test(SERVICE_HOST, port, users_count=users_count, count=count)
+        finally:
+            await service.close()
 
-        return max_item
+    with quiet_logging():
+        results = asyncio.run(scenario())
+    print(f"Equipment service, {count} requests per run (60% recommend, 25% quote, 10% edit-user, "
+          f"5% add-equipment), load generator in the same process ({os.cpu_count()} CPU)")
+    print_load_results(results)
 
-class BaseEquipment(Equipment):
-    def __init__(self, name, gender, skill):
-        super().__init__(name, gender, skill)
+def benchmark_recommend_many(sizes=(1000, 10000, 100000), catalog_size=2000):
+    with quiet_logging():
+        catalog = generate_catalog(catalog_size)
+    print(f"recommend_many, catalog of {catalog_size} items per category")
+    for size in sizes:
+        with quiet_logging():
+            users = generate_users(size, seed=size)
+            start = time.perf_counter()
+            recommend_many(users, catalog)
+            elapsed = time.perf_counter() - start
+        print(f"{size:>7} users: {elapsed:.3f} s, {size / elapsed:,.0f} users/s")
 
-    def display_info(self):
-        print(f"Base Equipment Info: {self.name}, {self.gender}, {self.skill}")
+BENCHMARKS = {
+    "recommend_many": benchmark_recommend_many,
+    "memory": benchmark_memory,
+    "pricing": benchmark_pricing,
+    "price_table": benchmark_price_table,
+    "snapshot": benchmark_snapshot,
+    "import": benchmark_import,
+    "journal": benchmark_journal,
+    "concurrency": benchmark_concurrency,
+    "versions": benchmark_versions,
+    "parallel": benchmark_parallel,
+    "shared": benchmark_shared,
+    "service": benchmark_service,
+}
 
-    def __str__(self):
-        return f"BaseEquipment(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill})"
+def run_benchmarks(names):
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark: {name}. Available: {', '.join(BENCHMARKS)}")
+            continue
+        BENCHMARKS[name]()
 
-    def __repr__(self):
-        return f"BaseEquipment(name='{self.name}', gender='{self.gender}', skill='{self.skill}')"
+def check_aggregating_list():
+    """Экстремумы AggregatingList после sort, reverse, pop, += и *= совпадают с пересчетом по списку"""
+    with quiet_logging():
+        items = AggregatingList(Board(f"CheckBoard{height}", "male", "advanced", height)
+                                for height in (150, 170, 160, 165))
+        extra = Board("CheckBoard180", "male", "advanced", 180)
 
-    def get_usage_instructions(self):
-        return "Basic usage instructions for all equipment"
+    def expect(step):
+        heights = [item.height for item in items]
+        for operation, actual in (("max", items.tracker.max_value("height")),
+                                  ("min", items.tracker.min_value("height"))):
+            expected = (max if operation == "max" else min)(heights) if heights else None
+            if actual != expected:
+                raise AssertionError(f"after {step}: {operation} height is {actual}, expected {expected}")
+        if len(items.tracker) != len(items):
+            raise AssertionError(f"after {step}: tracker holds {len(items.tracker)} of {len(items)} items")
 
-    def calculate_rental_price(self, days):
-        return 20 * days
+    items.sort(key=lambda item: item.height)
+    items.pop(-1)
+    expect("sort + pop")
+    items.sort(key=lambda item: item.height, reverse=True)
+    items.pop(0)
+    expect("sort(reverse=True) + pop")
+    items.reverse()
+    items.pop()
+    expect("reverse + pop")
+    items += [extra]
+    expect("+=")
+    items *= 2
+    items.remove(extra)
+    expect("*= + remove")
+    items *= 0
+    expect("*= 0")
 
-class DerivedEquipment(BaseEquipment):
-    def __init__(self, name, gender, skill, additional_info):
-        super().__init__(name, gender, skill)
-        self.additional_info = additional_info
+def equipment_identity(item):
+    return None if item is None else (item.name, item.gender)
 
-    def display_info(self):
-        print(f"Derived Equipment Info: {self.name}, {self.gender}, {self.skill}, {self.additional_info}")
+def check_parallel_equivalence(count=300, user_count=200):
+    """Пул процессов (первое совпадение и scored) и шарды SharedCatalog подбирают те же позиции,
+    что и последовательный подбор по тому же каталогу"""
+    with quiet_logging():
+        catalog = ConcurrentCatalog(generate_catalog(count))
+        users = generate_users(user_count)
+        expected = {scored: [[equipment_identity(recommend_category(user, category, catalog, scored))
+                              for category in Recommendation.CATEGORIES] for user in users]
+                    for scored in (False, True)}
+        results = {}
+        for scored in (False, True):
+            recommender = ParallelRecommender(catalog, "process", timeout=60.0, scored=scored)
+            try:
+                results["process (scored)" if scored else "process"] = (scored, [recommender.recommend(user)
+                                                                                for user in users])
+            finally:
+                recommender.close()
+        shared = SharedCatalog(catalog)
+        try:
+            results["shared"] = (False, shared.recommend_many(users))
+        finally:
+            shared.close()
+    for mode, (scored, recommendations) in results.items():
+        for user, matches, recommendation in zip(users, expected[scored], recommendations):
+            actual = [equipment_identity(recommendation.get(category)) for category in Recommendation.CATEGORIES]
+            if actual != matches:
+                differing = sum(1 for matches, recommendation in zip(expected[scored], recommendations)
+                                if matches != [equipment_identity(recommendation.get(category))
+                                               for category in Recommendation.CATEGORIES])
+                raise AssertionError(f"{mode}: {differing} of {len(users)} users differ from the sequential "
+                                     f"path, e.g. {user.name}: {actual} instead of {matches}")
 
-    def call_base_display(self):
-        super().display_info()
+CHECKS = {
+    "aggregating_list": check_aggregating_list,
+    "parallel_equivalence": check_parallel_equivalence,
+}
 
-    def conditional_display(self, condition):
-        if condition:
-            self.display_info()
+def run_checks(names):
+    """Регрессионные проверки; возвращает число неудачных"""
+    failed = 0
+    for name in names or CHECKS:
+        if name not in CHECKS:
+            print(f"Unknown check: {name}. Available: {', '.join(CHECKS)}")
+            failed += 1
+            continue
+        try:
+            CHECKS[name]()
+        except AssertionError as e:
+            failed += 1
+            print(f"{name}: FAILED, {e}")
         else:
-            super().display_info()
+            print(f"{name}: ok")
+    return failed
 
-    def __str__(self):
-        return f"DerivedEquipment(Name: {self.name}, Gender: {self.gender}, Skill: {self.skill}, Additional Info: {self.additional_info})"
+def render_str(item):
+    return str(item)
 
-    def __repr__(self):
-        return f"DerivedEquipment(name='{self.name}', gender='{self.gender}', skill='{self.skill}', additional_info='{self.additional_info}')"
+def render_info(item):
+    return item.format_info()
 
-    def get_usage_instructions(self):
-        return f"Special instructions: {self.additional_info}"
+def render_instructions(item):
+    return f"{item.name}: {item.get_usage_instructions()}"
 
-    def calculate_rental_price(self, days):
-        return super().calculate_rental_price(days) * 1.5
+def render_lines(items, renderer=render_str):
+    """Ленивый поток строк вывода: по одной строке на позицию"""
+    for item in items:
+        yield renderer(item)
 
-def recommend_board(user, boards):
-    for board in boards:
-        if (board.gender == user.gender and
-            board.skill == user.skill and
-            board.height >= user.height - 10 and
-            board.height <= user.height + 10):
-            log_action(f"Recommended board: {board.name} for user {user.name}")
-            return board
-    raise EquipmentNotFoundError("No suitable board found.")
+class OutputSink:
+    """Буферизованный вывод: строки копятся и пишутся в поток одним write на пачку"""
 
-def recommend_boots(user, boots):
-    for boot in boots:
-        if (boot.gender == user.gender and
-            boot.skill == user.skill and
-            boot.leg_size == user.leg_size):
-            log_action(f"Recommended boots: {boot.name} for user {user.name}")
-            return boot
-    raise EquipmentNotFoundError("No suitable boots found.")
+    def __init__(self, stream=None, buffer_size=64 * 1024):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+        self.lines = 0
 
-def recommend_fasteners(user, fasteners):
-    for fastener in fasteners:
-        if (fastener.gender == user.gender and
-            fastener.skill == user.skill and
-            fastener.fasteners == user.fasteners):
-            log_action(f"Recommended fasteners: {fastener.name} for user {user.name}")
-            return fastener
-    raise EquipmentNotFoundError("No suitable fasteners found.")
+    def write_line(self, line):
+        self.buffer.append(line)
+        self.buffer.append("\n")
+        self.buffered += len(line) + 1
+        self.lines += 1
+        if self.buffered >= self.buffer_size:
+            self.flush()
 
-def recommend_helmet(user, helmets):
-    for helmet in helmets:
-        if (helmet.gender == user.gender and
-            helmet.size == user.helmet_size):
-            log_action(f"Recommended helmet: {helmet.name} for user {user.name}")
-            return helmet
-    raise EquipmentNotFoundError("No suitable helmet found.")
+    def write_lines(self, lines):
+        for line in lines:
+            self.write_line(line)
+
+    def flush(self):
+        if self.buffer:
+            stream = self.stream or sys.stdout
+            stream.write("".join(self.buffer))
+            stream.flush()
+            self.buffer.clear()
+            self.buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.flush()
+
+class ListingCursor:
+    """Курсор по ленивому потоку строк: выдает страницы и помнит позицию"""
+
+    def __init__(self, items, renderer=render_str, page_size=50):
+        self.lines = render_lines(items, renderer)
+        self.page_size = page_size
+        self.position = 0
+        self.exhausted = False
+
+    def next_page(self):
+        page = list(islice(self.lines, self.page_size))
+        self.position += len(page)
+        if len(page) < self.page_size:
+            self.exhausted = True
+        return page
+
+    def __iter__(self):
+        while not self.exhausted:
+            page = self.next_page()
+            if page:
+                yield page
+
+PAGE_SIZE = 50
+
+def print_listing(items, renderer=render_str, page_size=PAGE_SIZE, stream=None, pause=True):
+    """Постраничный потоковый вывод; между страницами спрашивает, продолжать ли"""
+    cursor = ListingCursor(items, renderer, page_size)
+    with OutputSink(stream) as sink:
+        for page in cursor:
+            sink.write_lines(page)
+            if pause and not cursor.exhausted:
+                sink.flush()
+                answer = input(f"-- {cursor.position} shown, Enter for more, q to stop -- ")
+                if answer.strip().lower() == "q":
+                    break
+    return cursor.position
 
 def edit_user_info(user):
     while True:
@@ -414,17 +4941,18 @@ def edit_user_info(user):
 
     return user
 
-def interactive_menu(user, boards, boots, fasteners, helmets):
+def interactive_menu(user, boards, boots, fasteners, helmets, versions=None, recommender=None):
     equipment_manager = EquipmentManager()
-    equipment_1d = []
-    equipment_2d = []
+    equipment_1d = AggregatingList()
+    equipment_2d = AggregatingGrid()
     base_equipment = None
     derived_equipment = None
+    recommendation_cache = RecommendationCache()
     
-    filter_by_gender = lambda items, gender: list(filter(lambda x: x.gender == gender, items))
-    sort_by_name = lambda items: sorted(items, key=lambda x: x.name)
-    calculate_total_rental = lambda items, days: sum(item.calculate_rental_price(days) for item in items)
-    print_instructions = lambda items: [print(f"{item.name}: {item.get_usage_instructions()}") for item in items]
+    filter_by_gender = lambda items, gender: EquipmentQuery(items).where(gender=gender).run()
+    sort_by_name = lambda items: EquipmentQuery(items).order_by("name").run()
+    calculate_total_rental = lambda items, days: RentalPricingEngine(items).totals([days])[0]
+    print_instructions = lambda items: print_listing(items, render_instructions)
 
     while True:
         print("\n1. Add a new board")
@@ -447,6 +4975,8 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
         print("18. Calculate total rental price (lambda)")
         print("19. Print usage instructions (lambda)")
         print("20. Exit")
+        print("21. Import equipment from CSV/JSONL file")
+        print("22. Catalog rental report (pinned version)")
         choice = input("Enter your choice: ")
 
         try:
@@ -478,9 +5008,21 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
                     helmets.add(new_helmet)
                     print("\nNew helmet added:")
                     print(new_helmet)
+            elif choice == "5" and recommender is not None:
+                recommendation = recommender.recommend(user)
+                for category, title in (("board", "Board"), ("boots", "Boots"),
+                                        ("fasteners", "Fasteners"), ("helmet", "Helmet")):
+                    try:
+                        recommended = recommendation.require(category)
+                        print(f"\nRecommended {title}:")
+                        print(recommended.format_info())
+                        print("Usage:", recommended.get_usage_instructions())
+                        print(f"Rental price for 3 days: ${recommended.calculate_rental_price(3):.2f}")
+                    except EquipmentNotFoundError as e:
+                        print(f"\n{e}")
             elif choice == "5":
                 try:
-                    recommended_board = recommend_board(user, boards)
+                    recommended_board = recommend_board(user, boards, recommendation_cache)
                     print("\nRecommended Board:")
                     print(recommended_board.format_info())
                     print("Usage:", recommended_board.get_usage_instructions())
@@ -489,7 +5031,7 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
                     print(f"\n{e}")
 
                 try:
-                    recommended_boots = recommend_boots(user, boots)
+                    recommended_boots = recommend_boots(user, boots, recommendation_cache)
                     print("\nRecommended Boots:")
                     print(recommended_boots.format_info())
                     print("Usage:", recommended_boots.get_usage_instructions())
@@ -498,7 +5040,7 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
                     print(f"\n{e}")
 
                 try:
-                    recommended_fasteners = recommend_fasteners(user, fasteners)
+                    recommended_fasteners = recommend_fasteners(user, fasteners, recommendation_cache)
                     print("\nRecommended Fasteners:")
                     print(recommended_fasteners.format_info())
                     print("Usage:", recommended_fasteners.get_usage_instructions())
@@ -507,7 +5049,7 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
                     print(f"\n{e}")
 
                 try:
-                    recommended_helmet = recommend_helmet(user, helmets)
+                    recommended_helmet = recommend_helmet(user, helmets, recommendation_cache)
                     print("\nRecommended Helmet:")
                     print(recommended_helmet.format_info())
                     print("Usage:", recommended_helmet.get_usage_instructions())
@@ -519,7 +5061,7 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
                 user = edit_user_info(user)
             elif choice == "7":
                 print("\nCreating 1D list of equipment:")
-                equipment_1d = []
+                equipment_1d = AggregatingList()
                 while True:
                     print("\n1. Add Board")
                     print("2. Add Boots")
@@ -545,11 +5087,10 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
                     else:
                         print("Invalid choice. Please try again.")
                 print("\n1D list created:")
-                for item in equipment_1d:
-                    print(item)
+                print_listing(equipment_1d)
             elif choice == "8":
                 print("\nCreating 2D list of equipment:")
-                equipment_2d = []
+                equipment_2d = AggregatingGrid()
                 while True:
                     print("\n1. Add a new row")
                     print("2. Finish creating 2D list")
@@ -587,16 +5128,17 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
                     else:
                         print("Invalid choice. Please try again.")
                 print("\n2D list created:")
-                for row in equipment_2d:
-                    for item in row:
-                        print(item)
+                print_listing(chain.from_iterable(equipment_2d))
             elif choice == "9":
                 if not equipment_2d:
                     print("\n2D list is empty. Please create a 2D list first.")
                 else:
                     attribute = input("\nEnter attribute to find max value (e.g., height, leg_size): ")
                     try:
-                        max_item = equipment_manager.find_max_value(equipment_2d, attribute)
+                        if equipment_2d.tracker.covers(attribute):
+                            max_item = equipment_2d.max_item(attribute)
+                        else:
+                            max_item = equipment_manager.find_max_value(equipment_2d, attribute)
                         print(f"\nObject with max {attribute} in 2D list: {max_item}")
                     except ValueError as e:
                         print(f"\nError: {e}")
@@ -640,13 +5182,11 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
                 gender = input("Enter gender to filter (male/female): ")
                 filtered = filter_by_gender(equipment_1d, gender)
                 print(f"\nEquipment for {gender}:")
-                for item in filtered:
-                    print(item)
+                print_listing(filtered)
             elif choice == "17":
                 sorted_eq = sort_by_name(equipment_1d)
                 print("\nEquipment sorted by name:")
-                for item in sorted_eq:
-                    print(item)
+                print_listing(sorted_eq)
             elif choice == "18":
                 days = int(input("Enter rental days: "))
                 total = calculate_total_rental(equipment_1d, days)
@@ -654,6 +5194,25 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
             elif choice == "19":
                 print("\nUsage instructions:")
                 print_instructions(equipment_1d)
+            elif choice == "21":
+                path = input("Enter path to CSV or JSONL file: ")
+                report = import_equipment(path, EquipmentCatalog(boards, boots, fasteners, helmets))
+                print(f"\n{report.summary()}")
+                for error in report.errors[:10]:
+                    print(f"  {error}")
+                if report.rejected > 10:
+                    print(f"  ... and {report.rejected - 10} more rejected rows")
+            elif choice == "22":
+                if versions is None:
+                    print("Versioned catalog is not available.")
+                else:
+                    days = int(input("Enter rental days: "))
+                    # Отчет читает одну зафиксированную версию и не мешает добавлениям
+                    version = versions.pin()
+                    print(f"\nCatalog version {version.number}: {len(version)} items")
+                    print_listing(version, lambda item: f"{item} - ${item.calculate_rental_price(days):.2f}")
+                    total = RentalPricingEngine(version).totals([days])[0]
+                    print(f"Total rental price for {days} days: ${total:.2f}")
             elif choice == "20":
                 print("Exiting...")
                 break
@@ -664,42 +5223,127 @@ def interactive_menu(user, boards, boots, fasteners, helmets):
         finally:
             print("\nReturning to main menu...")
 
-def main():
+def open_catalog(journaled=False, database=None):
+    """Рабочий каталог магазина: журнал со снимком, файл SQLite по пути database или каталог
+    в памяти по умолчанию. Пустой каталог заполняется стартовым набором."""
+    if journaled:
+        store = JournaledCatalog()
+    elif database is not None:
+        store = SQLiteCatalog(database)
+    else:
+        store = EquipmentCatalog()
+    catalog = ConcurrentCatalog(store)
+    loaded = len(catalog)
+    if loaded:
+        # Позиции, восстановленные с диска, тоже снаряжение магазина: счетчик не начинается с нуля
+        with Equipment.counter_lock:
+            Equipment.total_equipment += loaded
+        log_action(f"Loaded {loaded} Equipment objects from {store.__class__.__name__}")
+    else:
+        log_action(f"Importing seed catalog into {catalog.catalog.__class__.__name__}")
+        catalog.add(Board("Board1", "male", "intermediate", 170))
+        catalog.add(Board("Board2", "female", "beginner", 160))
+        catalog.add(Board("Board3", "male", "advanced", 180))
+
+        catalog.add(Boots("Boots1", "male", "intermediate", 42))
+        catalog.add(Boots("Boots2", "female", "beginner", 38))
+        catalog.add(Boots("Boots3", "male", "advanced", 44))
+
+        catalog.add(Fasteners("Fasteners1", "male", "intermediate", "M"))
+        catalog.add(Fasteners("Fasteners2", "female", "beginner", "S"))
+        catalog.add(Fasteners("Fasteners3", "male", "advanced", "L"))
+
+        catalog.add(Helmet("Helmet1", "male", "L"))
+        catalog.add(Helmet("Helmet2", "female", "M"))
+        catalog.add(Helmet("Helmet3", "male", "XL"))
+    return catalog
+
+def open_recommender(catalog, parallel):
+    if parallel == "shared":
+        return SharedCatalog(catalog)
+    if parallel is not None:
+        return ParallelRecommender(catalog, parallel)
+    return None
+
+def main(journaled=False, parallel=None, database=None, log_echo=False):
+    start_async_logging(console=log_echo)
+    catalog = None
+    recommender = None
     try:
         log_action("Program started")
         user = User.from_input()
         if not user:
             return
 
-        boards = set()
-        boots = set()
-        fasteners = set()
-        helmets = set()
-
-        boards.add(Board("Board1", "male", "intermediate", 170))
-        boards.add(Board("Board2", "female", "beginner", 160))
-        boards.add(Board("Board3", "male", "advanced", 180))
-
-        boots.add(Boots("Boots1", "male", "intermediate", 42))
-        boots.add(Boots("Boots2", "female", "beginner", 38))
-        boots.add(Boots("Boots3", "male", "advanced", 44))
-
-        fasteners.add(Fasteners("Fasteners1", "male", "intermediate", "M"))
-        fasteners.add(Fasteners("Fasteners2", "female", "beginner", "S"))
-        fasteners.add(Fasteners("Fasteners3", "male", "advanced", "L"))
-
-        helmets.add(Helmet("Helmet1", "male", "L"))
-        helmets.add(Helmet("Helmet2", "female", "M"))
-        helmets.add(Helmet("Helmet3", "male", "XL"))
+        catalog = open_catalog(journaled, database)
 
         print(f"\nTotal equipment created: {Equipment.get_total_equipment()}")
 
-        interactive_menu(user, boards, boots, fasteners, helmets)
+        versions = VersionedCatalog(catalog)
+        recommender = open_recommender(catalog, parallel)
+        interactive_menu(user, catalog.boards, catalog.boots, catalog.fasteners, catalog.helmets,
+                         versions, recommender)
     except CustomError as e:
         print(f"An error occurred: {e}")
     finally:
+        if recommender is not None:
+            recommender.close()
+        if catalog is not None:
+            catalog.close()
         log_action("Program execution completed")
+        stop_async_logging()
         print("\nProgram execution completed. Check equipment_log.log for details.")
 
+def serve(port=SERVICE_PORT, journaled=False, parallel=None, host=SERVICE_HOST, database=None,
+          log_echo=False):
+    """Запуск JSON-сервиса для киосков вместо интерактивного меню (до Ctrl+C)"""
+    start_async_logging(console=log_echo)
+    catalog = open_catalog(journaled, database)
+    recommender = open_recommender(catalog, parallel)
+
+    async def run():
+        service = EquipmentService(catalog, recommender)
+        await service.start(host, port)
+        print(f"Serving on http://{host}:{service.port} (Ctrl+C to stop)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if recommender is not None:
+            recommender.close()
+        catalog.close()
+        stop_async_logging()
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    options = sys.argv[1:]
+
+    def option_port(flag):
+        value = options[options.index(flag) + 1] if flag in options[:-1] else ""
+        return int(value) if value.isdigit() else SERVICE_PORT
+
+    def option_path(flag, default):
+        value = options[options.index(flag) + 1] if flag in options[:-1] else ""
+        return value if value and not value.startswith("--") else default
+
+    parallel = options[options.index("--parallel") + 1] if "--parallel" in options[:-1] else None
+    # Файл SQLite только по --db [путь]; без флага каталог живет в памяти процесса
+    database = option_path("--db", CATALOG_DB) if "--db" in options else None
+    if options[:1] == ["--bench"]:
+        run_benchmarks(options[1:])
+    elif options[:1] == ["--check"]:
+        sys.exit(1 if run_checks(options[1:]) else 0)
+    elif options[:1] == ["--load"]:
+        # Нагрузка на уже запущенный сервис: --load [порт]
+        print_load_results(asyncio.run(load_test(SERVICE_HOST, option_port("--load"), prefix=f"Load{os.getpid()}-")))
+    elif "--serve" in options:
+        serve(option_port("--serve"), journaled="--journal" in options, parallel=parallel, database=database,
+              log_echo="--log-echo" in options)
+    else:
+        main(journaled="--journal" in options, parallel=parallel, database=database,
+             log_echo="--log-echo" in options)
\ No newline at end of file